@@ -3,6 +3,40 @@ Finite Automata Implementation for Unit Conversion Language
 Lexical Analyzers for Identifiers and Constants
 """
 
+import codecs
+
+
+def _char_class_stand_in(error):
+    """
+    Encode error handler for characters outside Latin-1: replace each one
+    with a Latin-1 character that δ treats the same way (letter, digit
+    or other), so the byte tables give the same result as δ itself
+    """
+    run = error.object[error.start:error.end]
+    stand_ins = ''.join('a' if c.isalpha() else '²' if c.isdigit() else '?' for c in run)
+    return stand_ins, error.end
+
+
+codecs.register_error('fa_char_class', _char_class_stand_in)
+
+
+def compile_table(fa, states):
+    """
+    Compile the transition function of an FA into a flat DFA table
+    Row s (1-based index into states) holds 256 entries, one per byte:
+    table[(s << 8) | byte] is the next state index, 0 means reject
+    """
+    table = bytearray((len(states) + 1) << 8)
+
+    for s, name in enumerate(states, 1):
+        for b in range(256):
+            fa.state = name
+            if fa.transition(chr(b)):
+                table[(s << 8) | b] = states.index(fa.state) + 1
+
+    fa.reset()
+    return bytes(table)
+
 
 class IdentifierFA:
     """
@@ -10,8 +44,12 @@ class IdentifierFA:
     Language: [a-zA-Z][a-zA-Z0-9]*
     """
 
+    states = ('q0', 'q1')
+    accepting = frozenset({2})  # q1
+
     def __init__(self):
         self.state = 'q0'  # Initial state
+        self.table = compile_table(self, self.states)
 
     def reset(self):
         """Reset automaton to initial state"""
@@ -59,13 +97,18 @@ class IdentifierFA:
         if not string:
             return False, "Empty string is not a valid identifier"
 
-        self.reset()
-
-        for i, char in enumerate(string):
-            if not self.transition(char):
-                return False, f"Rejected at position {i}: '{char}' is invalid"
-
-        if self.is_accepting():
+        # Table-driven run of δ: one bytes lookup per character
+        table = self.table
+        state = 1
+        for i, b in enumerate(string.encode('latin-1', 'fa_char_class')):
+            next_state = table[(state << 8) | b]
+            if not next_state:
+                self.state = self.states[state - 1]
+                return False, f"Rejected at position {i}: '{string[i]}' is invalid"
+            state = next_state
+
+        self.state = self.states[state - 1]
+        if state in self.accepting:
             return True, "Valid identifier"
         else:
             return False, "String not accepted"
@@ -77,8 +120,12 @@ class ConstantFA:
     Language: 0 | -?[1-9][0-9]*
     """
 
+    states = ('q0', 'q1', 'q2', 'q3')
+    accepting = frozenset({3, 4})  # q2, q3
+
     def __init__(self):
         self.state = 'q0'  # Initial state
+        self.table = compile_table(self, self.states)
 
     def reset(self):
         """Reset automaton to initial state"""
@@ -156,13 +203,18 @@ class ConstantFA:
         if not string:
             return False, "Empty string is not a valid constant"
 
-        self.reset()
-
-        for i, char in enumerate(string):
-            if not self.transition(char):
-                return False, f"Rejected at position {i}: '{char}' is invalid in state {self.state}"
-
-        if self.is_accepting():
+        # Table-driven run of δ: one bytes lookup per character
+        table = self.table
+        state = 1
+        for i, b in enumerate(string.encode('latin-1', 'fa_char_class')):
+            next_state = table[(state << 8) | b]
+            if not next_state:
+                self.state = self.states[state - 1]
+                return False, f"Rejected at position {i}: '{string[i]}' is invalid in state {self.state}"
+            state = next_state
+
+        self.state = self.states[state - 1]
+        if state in self.accepting:
             return True, "Valid constant"
         else:
             return False, f"String not accepted (ended in non-accepting state {self.state})"
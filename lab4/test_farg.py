@@ -0,0 +1,31 @@
+"""
+Tests for the table-driven identifier and constant FAs
+"""
+
+import unittest
+
+from farg import IdentifierFA, ConstantFA
+
+
+class TestNonLatin1Characters(unittest.TestCase):
+
+    def test_identifier_letters_outside_latin1(self):
+        fa = IdentifierFA()
+        self.assertTrue(fa.recognize("Ābc")[0])
+        self.assertTrue(fa.recognize("x中")[0])
+        self.assertTrue(fa.recognize("x٣")[0])  # non-ASCII digit
+
+    def test_identifier_other_characters_outside_latin1(self):
+        fa = IdentifierFA()
+        self.assertEqual(fa.recognize("x€"), (False, "Rejected at position 1: '€' is invalid"))
+        self.assertFalse(fa.recognize("٣x")[0])
+
+    def test_constant_digits_outside_latin1(self):
+        fa = ConstantFA()
+        self.assertTrue(fa.recognize("1٣")[0])
+        self.assertFalse(fa.recognize("٣")[0])
+        self.assertFalse(fa.recognize("1Ā")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
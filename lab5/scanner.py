@@ -1,3 +1,51 @@
+import re
+
+
+# Keywords
+KEYWORDS = frozenset({
+    'convert', 'to', 'print', 'if', 'then', 'else',
+    'for', 'in', 'do'
+})
+
+# Units
+UNITS = frozenset({
+    'ml', 'cl', 'dl', 'l',
+    'mm', 'cm', 'dm', 'm', 'dam', 'hm', 'km',
+    'ms', 's', 'min', 'hr', 'd', 'wk', 'mo', 'yr',
+    'mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'
+})
+
+# Token type of each reserved word, so classification is a single lookup
+WORD_TYPES = {
+    **{keyword: 'KEYWORD' for keyword in KEYWORDS},
+    **{unit: 'UNIT' for unit in UNITS}
+}
+
+# Operators and delimiters (two character operators are tried first)
+TWO_CHAR_TOKENS = {
+    '==': 'EQUAL',
+    '!=': 'NOT_EQUAL',
+    '>=': 'GREATER_EQUAL',
+    '<=': 'LESS_EQUAL'
+}
+
+SINGLE_CHAR_TOKENS = {
+    '=': 'ASSIGN',
+    '+': 'PLUS',
+    '*': 'MULTIPLY',
+    '/': 'DIVIDE',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '{': 'LBRACE',
+    '}': 'RBRACE',
+    '[': 'LBRACKET',
+    ']': 'RBRACKET',
+    ',': 'COMMA',
+    '>': 'GREATER',
+    '<': 'LESS'
+}
+
+
 class Token:
 
     def __init__(self, token_type, value, line, column):
@@ -10,58 +58,9 @@ class Token:
         return f"Token({self.type}, '{self.value}', {self.line}:{self.column})"
 
 
-class IdentifierFA:
-    """FA for identifiers"""
-
-    def recognize(self, string):
-        if not string:
-            return False
-
-        # First character must be a letter
-        if not string[0].isalpha():
-            return False
-
-        # Rest can be letters or digits
-        for char in string[1:]:
-            if not (char.isalpha() or char.isdigit()):
-                return False
-
-        return True
-
-
-class ConstantFA:
-    """FA for constants"""
-
-    def recognize(self, string):
-        if not string:
-            return False
-
-        # Special case: standalone "0"
-        if string == "0":
-            return True
-
-        # Check for optional minus sign
-        start_idx = 0
-        if string[0] == '-':
-            if len(string) == 1:  # just "-"
-                return False
-            start_idx = 1
-
-        # First digit after optional minus must be non-zero
-        if string[start_idx] not in '123456789':
-            return False
-
-        # Rest must be digits
-        for char in string[start_idx + 1:]:
-            if not char.isdigit():
-                return False
-
-        return True
-
-
 class Scanner:
     """
-    Scanner uses FA for identifiers and constants
+    Scanner runs the FA for identifiers and constants inline
     """
 
     def __init__(self, source_code):
@@ -71,23 +70,24 @@ class Scanner:
         self.column = 1
         self.tokens = []
 
-        # Finite Automata
-        self.identifier_fa = IdentifierFA()
-        self.constant_fa = ConstantFA()
-
-        # Keywords
-        self.keywords = {
-            'convert', 'to', 'print', 'if', 'then', 'else',
-            'for', 'in', 'do'
-        }
-
-        # Units
-        self.units = {
-            'ml', 'cl', 'dl', 'l',
-            'mm', 'cm', 'dm', 'm', 'dam', 'hm', 'km',
-            'ms', 's', 'min', 'hr', 'd', 'wk', 'mo', 'yr',
-            'mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'
-        }
+        # Keywords and units (shared, built once at import)
+        self.keywords = KEYWORDS
+        self.units = UNITS
+
+        # Bulk scanners for token bodies and whitespace
+        self._word_re = re.compile(r'\w+')
+        self._number_re = re.compile(r'-?\d*')
+        self._ws_re = re.compile(r'\s+')
+
+        # Jump table on the first character of a token (ASCII only)
+        self._dispatch = [self.scan_other] * 128
+        for char in '0123456789':
+            self._dispatch[ord(char)] = self.scan_digit
+        for char in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ':
+            self._dispatch[ord(char)] = self.scan_identifier_or_keyword
+        for char in '!' + ''.join(SINGLE_CHAR_TOKENS):
+            self._dispatch[ord(char)] = self.scan_operator
+        self._dispatch[ord('-')] = self.scan_number_or_minus
 
     def current_char(self):
         """Get current character"""
@@ -114,149 +114,133 @@ class Scanner:
 
     def skip_whitespace(self):
         """Skip whitespace characters"""
-        while self.current_char() and self.current_char().isspace():
-            self.advance()
+        src = self.source
+        start = self.pos
+        m = self._ws_re.match(src, start)
+        if m is None:
+            return
+
+        end = m.end()
+        newlines = src.count('\n', start, end)
+        if newlines:
+            self.line += newlines
+            self.column = end - src.rfind('\n', start, end)
+        else:
+            self.column += end - start
+        self.pos = end
 
     def scan_number_or_minus(self):
-        """Scan number or minus operator using Constant FA"""
-        start_pos = self.pos
+        """Scan number or minus operator, running the Constant FA inline"""
         start_col = self.column
-        lexeme = ""
 
-        # Check if it starts with minus
-        if self.current_char() == '-':
-            lexeme += self.current_char()
-            self.advance()
+        src = self.source
+        start = self.pos
+        end = self._number_re.match(src, start).end()
 
-            # If next character is a digit, try to match as number
-            if self.current_char() and self.current_char().isdigit():
-                while self.current_char() and self.current_char().isdigit():
-                    lexeme += self.current_char()
-                    self.advance()
-
-                # Validate with FA
-                if self.constant_fa.recognize(lexeme):
-                    return Token('NUMBER', lexeme, self.line, start_col)
-                else:
-                    return Token('ERROR', lexeme, self.line, start_col)
-            else:
-                # Just a minus operator
-                return Token('MINUS', '-', self.line, start_col)
+        # \d only covers decimal digits, but str.isdigit() also accepts
+        # characters such as superscripts, which belong to the number too
+        n = len(src)
+        while end < n and src[end].isdigit():
+            end += 1
 
-        # Positive number
-        while self.current_char() and self.current_char().isdigit():
-            lexeme += self.current_char()
+        # A minus not followed by a digit is the minus operator
+        if end - start == 1 and src[start] == '-':
             self.advance()
+            return Token('MINUS', '-', self.line, start_col)
 
-        # Validate with FA
-        if self.constant_fa.recognize(lexeme):
+        # Extract the lexeme with one slice once its end is known
+        lexeme = src[start:end]
+        self.column += end - start
+        self.pos = end
+
+        # The lexeme is already a minus and digits, so the FA only has to
+        # check the first digit: standalone 0, otherwise 1-9 (no leading zeros, no -0)
+        first_digit = lexeme[1] if lexeme[0] == '-' else lexeme[0]
+        if lexeme == '0' or first_digit in '123456789':
             return Token('NUMBER', lexeme, self.line, start_col)
         else:
             return Token('ERROR', lexeme, self.line, start_col)
 
     def scan_identifier_or_keyword(self):
-        """Scan identifier or keyword using Identifier FA"""
+        """Scan identifier or keyword, running the Identifier FA inline"""
         start_col = self.column
-        lexeme = ""
 
         # Collect alphanumeric characters
-        while self.current_char() and (self.current_char().isalnum() or self.current_char() == '_'):
-            lexeme += self.current_char()
-            self.advance()
-
-        # Validate with FA
-        if not self.identifier_fa.recognize(lexeme):
+        src = self.source
+        start = self.pos
+        end = self._word_re.match(src, start).end()
+        lexeme = src[start:end]
+        self.column += end - start
+        self.pos = end
+
+        # The FA: a letter, then letters or digits. For ASCII that is
+        # isalnum(), but beyond ASCII isalnum() also takes numerics such
+        # as '½' that are not digits, so those are checked per character
+        if lexeme.isascii():
+            valid = lexeme[0].isalpha() and lexeme.isalnum()
+        else:
+            valid = lexeme[0].isalpha() and all(c.isalpha() or c.isdigit() for c in lexeme)
+        if not valid:
             return Token('ERROR', lexeme, self.line, start_col)
 
-        # Check if it's a keyword
-        if lexeme in self.keywords:
-            return Token('KEYWORD', lexeme, self.line, start_col)
+        # Keyword, unit, or otherwise an identifier
+        return Token(WORD_TYPES.get(lexeme, 'IDENTIFIER'), lexeme, self.line, start_col)
 
-        # Check if it's a unit
-        if lexeme in self.units:
-            return Token('UNIT', lexeme, self.line, start_col)
+    def scan_digit(self):
+        """Scan number, or an invalid identifier starting with a digit"""
+        src = self.source
+        pos = self.pos + 1
+        if pos < len(src) and src[pos].isalpha():
+            return self.scan_identifier_or_keyword()
 
-        # It's an identifier
-        return Token('IDENTIFIER', lexeme, self.line, start_col)
+        return self.scan_number_or_minus()
 
-    def scan_token(self):
-        """Scan next token"""
-        self.skip_whitespace()
+    def scan_operator(self):
+        """Scan operator or delimiter"""
+        start_col = self.column
+        pair = self.source[self.pos:self.pos + 2]
 
-        if self.current_char() is None:
-            return None
+        if pair in TWO_CHAR_TOKENS:
+            self.pos += 2
+            self.column += 2
+            return Token(TWO_CHAR_TOKENS[pair], pair, self.line, start_col)
 
-        start_col = self.column
-        char = self.current_char()
-        next_char = self.peek()
+        # A lone '!' is not an operator
+        char = pair[0]
+        self.pos += 1
+        self.column += 1
+        return Token(SINGLE_CHAR_TOKENS.get(char, 'ERROR'), char, self.line, start_col)
 
-        # Identifier and keyword starting with number (error)
-        if char.isdigit():
-            if (next_char is not None) and next_char.isalpha():
-                return self.scan_identifier_or_keyword()
+    def scan_other(self):
+        """Scan token starting with a character outside the jump table"""
+        char = self.current_char()
 
-        # Numbers and minus
+        # Non-ASCII digits and letters
         if char.isdigit():
-            return self.scan_number_or_minus()
-
-        if char == '-':
-            return self.scan_number_or_minus()
+            return self.scan_digit()
 
-        # Identifiers and keywords
         if char.isalpha():
             return self.scan_identifier_or_keyword()
 
-        # Single character tokens
-        single_char_tokens = {
-            '=': 'ASSIGN',
-            '+': 'PLUS',
-            '*': 'MULTIPLY',
-            '/': 'DIVIDE',
-            '(': 'LPAREN',
-            ')': 'RPAREN',
-            '{': 'LBRACE',
-            '}': 'RBRACE',
-            '[': 'LBRACKET',
-            ']': 'RBRACKET',
-            ',': 'COMMA'
-        }
-
-        if char in single_char_tokens:
-            self.advance()
-            return Token(single_char_tokens[char], char, self.line, start_col)
-
-        # Two character tokens
-        if char == '=' and self.peek() == '=':
-            self.advance()
-            self.advance()
-            return Token('EQUAL', '==', self.line, start_col)
-
-        if char == '!' and self.peek() == '=':
-            self.advance()
-            self.advance()
-            return Token('NOT_EQUAL', '!=', self.line, start_col)
-
-        if char == '>' and self.peek() == '=':
-            self.advance()
-            self.advance()
-            return Token('GREATER_EQUAL', '>=', self.line, start_col)
+        # Unknown character
+        start_col = self.column
+        self.advance()
+        return Token('ERROR', char, self.line, start_col)
 
-        if char == '<' and self.peek() == '=':
-            self.advance()
-            self.advance()
-            return Token('LESS_EQUAL', '<=', self.line, start_col)
+    def scan_token(self):
+        """Scan next token"""
+        self.skip_whitespace()
 
-        if char == '>':
-            self.advance()
-            return Token('GREATER', '>', self.line, start_col)
+        src = self.source
+        pos = self.pos
+        if pos >= len(src):
+            return None
 
-        if char == '<':
-            self.advance()
-            return Token('LESS', '<', self.line, start_col)
+        code = ord(src[pos])
+        if code < 128:
+            return self._dispatch[code]()
 
-        # Unknown character
-        self.advance()
-        return Token('ERROR', char, self.line, start_col)
+        return self.scan_other()
 
     def scan(self):
         """Scan entire source code and return list of tokens"""
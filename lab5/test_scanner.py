@@ -0,0 +1,42 @@
+"""
+Tests for the scanner
+"""
+
+import unittest
+
+from scanner import Scanner
+
+
+def scan(source):
+    return [(token.type, token.value) for token in Scanner(source).scan()]
+
+
+class TestNumbers(unittest.TestCase):
+
+    def test_minus_operator(self):
+        self.assertEqual(scan("a - b"), [('IDENTIFIER', 'a'), ('MINUS', '-'), ('IDENTIFIER', 'b')])
+
+    def test_negative_number(self):
+        self.assertEqual(scan("-5"), [('NUMBER', '-5')])
+
+    def test_non_decimal_digit_is_not_minus(self):
+        # '²'.isdigit() is true, but it is not a decimal digit
+        self.assertEqual(scan("²"), [('ERROR', '²')])
+        self.assertEqual(scan("-²"), [('ERROR', '-²')])
+
+
+class TestIdentifiers(unittest.TestCase):
+
+    def test_non_ascii_letters_and_digits(self):
+        self.assertEqual(scan("xé٣"), [('IDENTIFIER', 'xé٣')])
+
+    def test_numerics_that_are_not_digits(self):
+        self.assertEqual(scan("a½"), [('ERROR', 'a½')])
+        self.assertEqual(scan("kⅷ"), [('ERROR', 'kⅷ')])
+
+    def test_underscore(self):
+        self.assertEqual(scan("x_y"), [('ERROR', 'x_y')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,35 @@
 """
 Lexer and Parser for Unit Conversion Language
-Uses PLY (Python Lex-Yacc)
+Lexer uses a precompiled master regex, parser uses PLY (Python Lex-Yacc)
 """
 
-import ply.lex as lex
+import os
+import re
+
 import ply.yacc as yacc
 
+# Generated LALR tables are written next to this file and reloaded on later builds
+TABLE_MODULE = 'lab6_parsetab'
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 # ============================================================================
 # LEXER (Scanner with FA for identifiers and constants)
 # ============================================================================
 
+class LexToken:
+    """Token handed to the yacc parser (same fields as ply.lex.LexToken)"""
+
+    def __init__(self, token_type, value, lineno, lexpos):
+        self.type = token_type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
 class Lexer:
     """Lexer with integrated FA for identifiers and constants"""
 
@@ -63,81 +82,76 @@ class Lexer:
         'mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'  # weight
     }
 
-    # Simple tokens
-    t_PLUS = r'\+'
-    t_MINUS = r'-'
-    t_MULTIPLY = r'\*'
-    t_DIVIDE = r'/'
-    t_ASSIGN = r'='
-    t_LPAREN = r'\('
-    t_RPAREN = r'\)'
-    t_LBRACE = r'\{'
-    t_RBRACE = r'\}'
-    t_LBRACKET = r'\['
-    t_RBRACKET = r'\]'
-    t_COMMA = r','
-
-    # Comparison operators (order matters - longer matches first)
-    t_EQUAL = r'=='
-    t_NOT_EQUAL = r'!='
-    t_GREATER_EQUAL = r'>='
-    t_LESS_EQUAL = r'<='
-    t_GREATER = r'>'
-    t_LESS = r'<'
-
-    # Ignored characters (whitespace)
-    t_ignore = ' \t'
+    # Token type of every reserved word and unit, for identifier reclassification
+    kw_unit = {**reserved, **{unit: 'UNIT' for unit in units}}
+
+    # Token rules in match order (order matters - longer matches first)
+    token_rules = [
+        ('newline', r'\n+'),
+        ('ignore', r'[ \t]+'),  # Ignored characters (whitespace)
+        ('NUMBER', r'-?\d+(?:\.\d+)?'),  # integers or decimals with optional leading minus
+        ('IDENTIFIER', r'[a-zA-Z][a-zA-Z0-9]*'),
+        ('EQUAL', r'=='),
+        ('NOT_EQUAL', r'!='),
+        ('GREATER_EQUAL', r'>='),
+        ('LESS_EQUAL', r'<='),
+        ('PLUS', r'\+'),
+        ('MINUS', r'-'),
+        ('MULTIPLY', r'\*'),
+        ('DIVIDE', r'/'),
+        ('ASSIGN', r'='),
+        ('LPAREN', r'\('),
+        ('RPAREN', r'\)'),
+        ('LBRACE', r'\{'),
+        ('RBRACE', r'\}'),
+        ('LBRACKET', r'\['),
+        ('RBRACKET', r'\]'),
+        ('COMMA', r','),
+        ('GREATER', r'>'),
+        ('LESS', r'<'),
+        ('error', r'.'),  # anything else is an illegal character
+    ]
+
+    # Master pattern: one alternation, the matching rule is m.lastgroup
+    master_pattern = re.compile('|'.join(f'(?P<{name}>{regex})' for name, regex in token_rules))
 
     def __init__(self):
-        self.lexer = None
-
-    def t_newline(self, t):
-        r'\n+'
-        t.lexer.lineno += len(t.value)
-
-    def t_NUMBER(self, t):
-        # match integers or decimals with optional leading minus
-        r'-?(\d+(\.\d+)?)'
-        # We accept numbers like: 0, -10, 3.14, -0.5, etc.
-        # Convert to int if no decimal part, else float
-        sv = t.value
-        if '.' in sv:
-            try:
-                t.value = float(sv)
-            except ValueError:
-                print(f"Illegal number: {sv}")
-                t.lexer.skip(1)
-                return
-        else:
-            try:
-                t.value = int(sv)
-            except ValueError:
-                print(f"Illegal number: {sv}")
-                t.lexer.skip(1)
-                return
-        return t
-
-    def t_IDENTIFIER(self, t):
-        r'[a-zA-Z][a-zA-Z0-9]*'
-        # Check if it's a reserved keyword
-        if t.value in self.reserved:
-            t.type = self.reserved[t.value]
-            return t
-        # Check if it's a unit
-        if t.value in self.units:
-            t.type = 'UNIT'
-            return t
-        # Otherwise it's an identifier
-        return t
-
-    def t_error(self, t):
-        print(f"Illegal character '{t.value[0]}' at line {t.lineno}")
-        t.lexer.skip(1)
+        self.lineno = 1
+        self.matches = iter(())
 
-    def build(self):
-        """Build the lexer"""
-        self.lexer = lex.lex(module=self)
-        return self.lexer
+    def input(self, data):
+        """Start lexing a new input string (called by yacc)"""
+        self.lineno = 1
+        self.matches = self.master_pattern.finditer(data)
+
+    def token(self):
+        """Return the next token, or None at end of input (called by yacc)"""
+        for m in self.matches:
+            kind = m.lastgroup
+            value = m.group()
+
+            if kind == 'ignore':
+                continue
+
+            if kind == 'newline':
+                self.lineno += len(value)
+                continue
+
+            if kind == 'IDENTIFIER':
+                # Reserved keyword, unit or plain identifier
+                kind = self.kw_unit.get(value, 'IDENTIFIER')
+
+            elif kind == 'NUMBER':
+                # Convert to int if no decimal part, else float
+                value = float(value) if '.' in value else int(value)
+
+            elif kind == 'error':
+                print(f"Illegal character '{value}' at line {self.lineno}")
+                continue
+
+            return LexToken(kind, value, self.lineno, m.start())
+
+        return None
 
 
 # ============================================================================
@@ -149,27 +163,32 @@ class Parser:
 
     def __init__(self):
         self.lexer = Lexer()
-        self.lexer.build()
         self.tokens = self.lexer.tokens
         self.parser = None
         self.productions = []  # Store derivation steps
+        self.trace = False  # Record productions only when asked
 
     # Grammar Rules with Productions
 
     def p_program(self, p):
         '''program : statement_list'''
         p[0] = ('program', p[1])
-        self.productions.append("program -> statement_list")
+        if self.trace:
+            self.productions.append("program -> statement_list")
 
     def p_statement_list(self, p):
-        '''statement_list : statement statement_list
+        '''statement_list : statement_list statement
                           | empty'''
+        # Left recursive: statements are appended to one flat node
         if len(p) == 3:
-            p[0] = ('statement_list', p[1], p[2])
-            self.productions.append("statement_list -> statement statement_list")
+            p[0] = p[1]
+            p[0].append(p[2])
+            if self.trace:
+                self.productions.append("statement_list -> statement_list statement")
         else:
-            p[0] = ('statement_list', 'epsilon')
-            self.productions.append("statement_list -> epsilon")
+            p[0] = ['statement_list']
+            if self.trace:
+                self.productions.append("statement_list -> epsilon")
 
     def p_statement(self, p):
         '''statement : assignment_stmt
@@ -179,52 +198,62 @@ class Parser:
                      | for_stmt'''
         p[0] = ('statement', p[1])
         # safe: p.slice[1].type exists for nonterminals like assignment_stmt etc.
-        self.productions.append(f"statement -> {p.slice[1].type.lower()}")
+        if self.trace:
+            self.productions.append(f"statement -> {p.slice[1].type.lower()}")
 
     def p_assignment_stmt(self, p):
         '''assignment_stmt : IDENTIFIER ASSIGN expression unit_opt'''
         p[0] = ('assignment', p[1], p[3], p[4])
-        self.productions.append("assignment_stmt -> IDENTIFIER = expression unit_opt")
+        if self.trace:
+            self.productions.append("assignment_stmt -> IDENTIFIER = expression unit_opt")
 
     def p_conversion_stmt(self, p):
         '''conversion_stmt : CONVERT IDENTIFIER TO UNIT'''
         p[0] = ('convert', p[2], p[4])
-        self.productions.append("conversion_stmt -> CONVERT IDENTIFIER TO UNIT")
+        if self.trace:
+            self.productions.append("conversion_stmt -> CONVERT IDENTIFIER TO UNIT")
 
     def p_print_stmt(self, p):
         '''print_stmt : PRINT expression'''
         p[0] = ('print', p[2])
-        self.productions.append("print_stmt -> PRINT expression")
+        if self.trace:
+            self.productions.append("print_stmt -> PRINT expression")
 
     def p_if_stmt(self, p):
         '''if_stmt : IF condition THEN block else_opt'''
         p[0] = ('if', p[2], p[4], p[5])
-        self.productions.append("if_stmt -> IF condition THEN block else_opt")
+        if self.trace:
+            self.productions.append("if_stmt -> IF condition THEN block else_opt")
 
     def p_else_opt(self, p):
         '''else_opt : ELSE block
                     | empty'''
         if len(p) == 3:
             p[0] = ('else', p[2])
-            self.productions.append("else_opt -> ELSE block")
+            if self.trace:
+                self.productions.append("else_opt -> ELSE block")
         else:
             p[0] = ('else', 'epsilon')
-            self.productions.append("else_opt -> epsilon")
+            if self.trace:
+                self.productions.append("else_opt -> epsilon")
 
     def p_for_stmt(self, p):
         '''for_stmt : FOR IDENTIFIER IN list_expr DO block'''
         p[0] = ('for', p[2], p[4], p[6])
-        self.productions.append("for_stmt -> FOR IDENTIFIER IN list_expr DO block")
+        if self.trace:
+            self.productions.append("for_stmt -> FOR IDENTIFIER IN list_expr DO block")
 
     def p_block(self, p):
         '''block : LBRACE statement_list RBRACE'''
         p[0] = ('block', p[2])
-        self.productions.append("block -> { statement_list }")
+        if self.trace:
+            self.productions.append("block -> { statement_list }")
 
     def p_condition(self, p):
         '''condition : expression comparison_op expression'''
         p[0] = ('condition', p[1], p[2], p[3])
-        self.productions.append("condition -> expression comparison_op expression")
+        if self.trace:
+            self.productions.append("condition -> expression comparison_op expression")
 
     def p_comparison_op(self, p):
         '''comparison_op : EQUAL
@@ -234,64 +263,63 @@ class Parser:
                          | GREATER_EQUAL
                          | LESS_EQUAL'''
         p[0] = p[1]
-        self.productions.append(f"comparison_op -> {p[1]}")
+        if self.trace:
+            self.productions.append(f"comparison_op -> {p[1]}")
 
     def p_list_expr(self, p):
-        '''list_expr : LBRACKET list_elements RBRACKET'''
-        p[0] = ('list', p[2])
-        self.productions.append("list_expr -> [ list_elements ]")
-
-    def p_list_elements(self, p):
-        '''list_elements : expression list_tail
-                         | empty'''
-        if len(p) == 3:
-            p[0] = ('list_elements', p[1], p[2])
-            self.productions.append("list_elements -> expression list_tail")
+        '''list_expr : LBRACKET list_elements RBRACKET
+                     | LBRACKET RBRACKET'''
+        if len(p) == 4:
+            p[0] = ('list', p[2])
+            if self.trace:
+                self.productions.append("list_expr -> [ list_elements ]")
         else:
-            p[0] = ('list_elements', 'epsilon')
-            self.productions.append("list_elements -> epsilon")
+            p[0] = ('list', ['list_elements'])
+            if self.trace:
+                self.productions.append("list_expr -> [ ]")
 
-    def p_list_tail(self, p):
-        '''list_tail : COMMA expression list_tail
-                     | empty'''
+    def p_list_elements(self, p):
+        '''list_elements : list_elements COMMA expression
+                         | expression'''
         if len(p) == 4:
-            p[0] = ('list_tail', p[2], p[3])
-            self.productions.append("list_tail -> , expression list_tail")
+            p[0] = p[1]
+            p[0].append(p[3])
+            if self.trace:
+                self.productions.append("list_elements -> list_elements , expression")
         else:
-            p[0] = ('list_tail', 'epsilon')
-            self.productions.append("list_tail -> epsilon")
+            p[0] = ['list_elements', p[1]]
+            if self.trace:
+                self.productions.append("list_elements -> expression")
 
     def p_expression(self, p):
-        '''expression : term expression_tail'''
-        p[0] = ('expression', p[1], p[2])
-        self.productions.append("expression -> term expression_tail")
-
-    def p_expression_tail(self, p):
-        '''expression_tail : PLUS term expression_tail
-                           | MINUS term expression_tail
-                           | empty'''
+        '''expression : expression PLUS term
+                      | expression MINUS term
+                      | term'''
+        # Flat node: first term, then (operator, term) pairs left to right
         if len(p) == 4:
-            p[0] = ('expression_tail', p[1], p[2], p[3])
-            self.productions.append(f"expression_tail -> {p[1]} term expression_tail")
+            p[0] = p[1]
+            p[0].extend((p[2], p[3]))
+            if self.trace:
+                self.productions.append(f"expression -> expression {p[2]} term")
         else:
-            p[0] = ('expression_tail', 'epsilon')
-            self.productions.append("expression_tail -> epsilon")
+            p[0] = ['expression', p[1]]
+            if self.trace:
+                self.productions.append("expression -> term")
 
     def p_term(self, p):
-        '''term : factor term_tail'''
-        p[0] = ('term', p[1], p[2])
-        self.productions.append("term -> factor term_tail")
-
-    def p_term_tail(self, p):
-        '''term_tail : MULTIPLY factor term_tail
-                     | DIVIDE factor term_tail
-                     | empty'''
+        '''term : term MULTIPLY factor
+                | term DIVIDE factor
+                | factor'''
+        # Flat node: first factor, then (operator, factor) pairs left to right
         if len(p) == 4:
-            p[0] = ('term_tail', p[1], p[2], p[3])
-            self.productions.append(f"term_tail -> {p[1]} factor term_tail")
+            p[0] = p[1]
+            p[0].extend((p[2], p[3]))
+            if self.trace:
+                self.productions.append(f"term -> term {p[2]} factor")
         else:
-            p[0] = ('term_tail', 'epsilon')
-            self.productions.append("term_tail -> epsilon")
+            p[0] = ['term', p[1]]
+            if self.trace:
+                self.productions.append("term -> factor")
 
     def p_factor(self, p):
         '''factor : NUMBER unit_opt
@@ -301,25 +329,30 @@ class Parser:
         if len(p) == 3:
             # NUMBER unit_opt  (unit_opt could be None)
             p[0] = ('factor', p[1], p[2])
-            self.productions.append("factor -> NUMBER unit_opt")
+            if self.trace:
+                self.productions.append("factor -> NUMBER unit_opt")
         elif len(p) == 2:
             # IDENTIFIER
             p[0] = ('factor', p[1])
-            self.productions.append("factor -> IDENTIFIER")
+            if self.trace:
+                self.productions.append("factor -> IDENTIFIER")
         else:
             # Parenthesized expression: LPAREN expression RPAREN
             p[0] = ('factor', p[2])
-            self.productions.append("factor -> ( expression )")
+            if self.trace:
+                self.productions.append("factor -> ( expression )")
 
     def p_unit_opt(self, p):
         '''unit_opt : UNIT
                     | empty'''
         if len(p) == 2 and p[1] is not None:
             p[0] = p[1]
-            self.productions.append("unit_opt -> UNIT")
+            if self.trace:
+                self.productions.append("unit_opt -> UNIT")
         else:
             p[0] = None
-            self.productions.append("unit_opt -> epsilon")
+            if self.trace:
+                self.productions.append("unit_opt -> epsilon")
 
     def p_empty(self, p):
         '''empty :'''
@@ -332,32 +365,54 @@ class Parser:
             print("Syntax error at EOF")
 
     def build(self):
-        """Build the parser"""
-        self.parser = yacc.yacc(module=self)
+        """Build the parser (LALR tables are loaded from TABLE_MODULE when up to date)"""
+        # debug keeps the grammar conflict warnings on stderr; the NullLogger
+        # only drops the parser.out report
+        self.parser = yacc.yacc(module=self, tabmodule=TABLE_MODULE, outputdir=TABLE_DIR,
+                                write_tables=True, debug=True,
+                                debuglog=yacc.NullLogger())
         return self.parser
 
-    def parse(self, input_string):
-        """Parse input string and return parse tree + productions"""
+    def parse(self, input_string, trace=False):
+        """Parse input string and return parse tree + productions (recorded only if trace)"""
         self.productions = []
-        result = self.parser.parse(input_string, lexer=self.lexer.lexer)
+        self.trace = trace
+        result = self.parser.parse(input_string, lexer=self.lexer)
         return result, self.productions
 
 
+# Built parser shared by every caller of get_parser()
+_shared_parser = None
+
+
+def get_parser():
+    """Return the shared Parser, building it on first use"""
+    global _shared_parser
+    if _shared_parser is None:
+        _shared_parser = Parser()
+        _shared_parser.build()
+    return _shared_parser
+
+
 # ============================================================================
 # MAIN PROGRAM
 # ============================================================================
 
 def print_parse_tree(tree, indent=0):
-    """Pretty print the parse tree"""
-    if tree is None:
-        return
-
-    if isinstance(tree, tuple):
-        print("  " * indent + str(tree[0]))
-        for child in tree[1:]:
-            print_parse_tree(child, indent + 1)
-    else:
-        print("  " * indent + str(tree))
+    """Pretty print the parse tree (iteratively, so deep trees cannot hit the recursion limit)"""
+    stack = [(tree, indent)]
+    while stack:
+        node, depth = stack.pop()
+        if node is None:
+            continue
+
+        # Nodes are tuples, or lists for the flat left-recursive rules
+        if isinstance(node, (tuple, list)):
+            print("  " * depth + str(node[0]))
+            for i in range(len(node) - 1, 0, -1):
+                stack.append((node[i], depth + 1))
+        else:
+            print("  " * depth + str(node))
 
 
 def main():
@@ -405,8 +460,7 @@ if x > 50 then {
         ("Parenthesized Expression", """result = (a + b) * c"""),
     ]
 
-    parser = Parser()
-    parser.build()
+    parser = get_parser()
 
     for name, program in test_programs:
         print("=" * 80)
@@ -417,7 +471,7 @@ if x > 50 then {
         print("\n" + "-" * 80)
 
         try:
-            parse_tree, productions = parser.parse(program)
+            parse_tree, productions = parser.parse(program, trace=True)
 
             print("Productions Used (Derivation):")
             print("-" * 80)
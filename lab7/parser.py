@@ -3,7 +3,7 @@ LL(1) Parser for Unit Conversion Language
 Implements LL(1) parsing algorithm with parse tree output
 """
 
-from collections import defaultdict
+from collections import defaultdict, deque
 import re
 
 
@@ -12,6 +12,8 @@ import re
 # ============================================================================
 
 class Token:
+    __slots__ = ('type', 'value', 'position')
+
     def __init__(self, token_type, value, position):
         self.type = token_type
         self.value = value
@@ -35,9 +37,14 @@ class Scanner:
             'mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'
         }
 
-        # Token patterns (order matters)
+        # Keywords and units end where an identifier would end
+        word_end = r'(?![a-zA-Z0-9])'
+
+        # Token patterns (order matters: keywords and units before IDENTIFIER)
         self.patterns = [
             ('NUMBER', r'0|[1-9][0-9]*'),
+            *[(keyword.upper(), keyword + word_end) for keyword in sorted(self.keywords)],
+            ('UNIT', '(?:' + '|'.join(sorted(self.units)) + ')' + word_end),
             ('IDENTIFIER', r'[a-zA-Z][a-zA-Z0-9]*'),
             ('EQ', r'=='),
             ('NE', r'!='),
@@ -60,41 +67,32 @@ class Scanner:
             ('WHITESPACE', r'\s+'),
         ]
 
+        # One master regex: the alternation is tried in pattern order and
+        # the name of the group that matched is the token type
+        self.master = re.compile('|'.join(f'(?P<{token_type}>{pattern})' for token_type, pattern in self.patterns))
+
     def scan(self, source_code):
         """Scan source and return PIF (Program Internal Form)"""
         pif = []
         position = 0
 
-        while position < len(source_code):
-            matched = False
-
-            for token_type, pattern in self.patterns:
-                regex = re.compile(pattern)
-                match = regex.match(source_code, position)
-
-                if match:
-                    value = match.group(0)
+        # Matches must be contiguous; a gap means an illegal character
+        for match in self.master.finditer(source_code):
+            if match.start() != position:
+                break
 
-                    # Skip whitespace
-                    if token_type == 'WHITESPACE':
-                        position = match.end()
-                        matched = True
-                        break
+            token_type = match.lastgroup
+            value = match.group(0)
+            position = match.end()
 
-                    # Classify IDENTIFIER
-                    if token_type == 'IDENTIFIER':
-                        if value in self.keywords:
-                            token_type = value.upper()
-                        elif value in self.units:
-                            token_type = 'UNIT'
+            # Skip whitespace
+            if token_type == 'WHITESPACE':
+                continue
 
-                    pif.append(Token(token_type, value, position))
-                    position = match.end()
-                    matched = True
-                    break
+            pif.append(Token(token_type, value, match.start()))
 
-            if not matched:
-                raise Exception(f"Illegal character at position {position}: '{source_code[position]}'")
+        if position < len(source_code):
+            raise Exception(f"Illegal character at position {position}: '{source_code[position]}'")
 
         pif.append(Token('$', '$', position))  # End marker
         return pif
@@ -112,23 +110,23 @@ class Grammar:
 
     def __init__(self):
         # Non-terminals
-        self.non_terminals = {
+        self.non_terminals = frozenset({
             'program', 'stmt_list', 'stmt_list_tail', 'statement',
             'assign_stmt', 'conv_stmt', 'print_stmt', 'if_stmt', 'for_stmt',
             'else_opt', 'block', 'condition', 'comp_op',
             'list_expr', 'list_elems', 'list_tail',
             'expression', 'expr_tail', 'term', 'term_tail', 'factor', 'unit_opt'
-        }
+        })
 
         # Terminals
-        self.terminals = {
+        self.terminals = frozenset({
             'IDENTIFIER', 'NUMBER', 'UNIT',
             'CONVERT', 'TO', 'PRINT', 'IF', 'THEN', 'ELSE', 'FOR', 'IN', 'DO',
             'ASSIGN', 'PLUS', 'MINUS', 'MULTIPLY', 'DIVIDE',
             'EQ', 'NE', 'GT', 'LT', 'GE', 'LE',
             'LPAREN', 'RPAREN', 'LBRACE', 'RBRACE', 'LBRACKET', 'RBRACKET', 'COMMA',
             'epsilon', '$'
-        }
+        })
 
         # Start symbol
         self.start_symbol = 'program'
@@ -220,6 +218,7 @@ class Grammar:
 
         # FIRST sets
         self.first = {}
+        self.first_cache = {}  # FIRST of a symbol sequence, keyed by tuple
         self.compute_first()
 
         # FOLLOW sets
@@ -230,29 +229,52 @@ class Grammar:
         self.parsing_table = {}
         self.build_parsing_table()
 
+        # Integer-indexed copy of the parsing table for the parser loop
+        self.symbols = []
+        self.symbol_ids = {}
+        self.id_table = []
+        self.build_id_table()
+
     def compute_first(self):
-        """Compute FIRST sets for all non-terminals"""
+        """Compute FIRST sets for all non-terminals (worklist algorithm)"""
         # Initialize
         for nt in self.non_terminals:
             self.first[nt] = set()
 
-        # Iterate until no changes
-        changed = True
-        while changed:
-            changed = False
-            for non_terminal, productions in self.productions.items():
-                for production in productions:
-                    old_size = len(self.first[non_terminal])
-
-                    # Calculate FIRST of production
-                    first_of_prod = self.first_of_sequence(production)
-                    self.first[non_terminal].update(first_of_prod)
-
-                    if len(self.first[non_terminal]) > old_size:
-                        changed = True
+        # FIRST(A) depends on FIRST(X) for every non-terminal X in A's productions
+        dependents = defaultdict(set)
+        for non_terminal, productions in self.productions.items():
+            for production in productions:
+                for symbol in production:
+                    if symbol in self.non_terminals:
+                        dependents[symbol].add(non_terminal)
+
+        # Revisit a non-terminal only when a FIRST set it depends on grew
+        worklist = deque(self.productions)
+        queued = set(worklist)
+        while worklist:
+            non_terminal = worklist.popleft()
+            queued.discard(non_terminal)
+
+            old_size = len(self.first[non_terminal])
+            for production in self.productions[non_terminal]:
+                self.first[non_terminal].update(self.first_of_sequence(production))
+
+            if len(self.first[non_terminal]) > old_size:
+                # Cached sequences containing this non-terminal are now stale
+                self.first_cache.clear()
+                for dependent in dependents[non_terminal]:
+                    if dependent not in queued:
+                        worklist.append(dependent)
+                        queued.add(dependent)
 
     def first_of_sequence(self, sequence):
         """Calculate FIRST set of a sequence of symbols"""
+        key = tuple(sequence)
+        cached = self.first_cache.get(key)
+        if cached is not None:
+            return cached
+
         result = set()
 
         for symbol in sequence:
@@ -271,10 +293,12 @@ class Grammar:
             # All symbols can derive epsilon
             result.add('epsilon')
 
+        result = frozenset(result)
+        self.first_cache[key] = result
         return result
 
     def compute_follow(self):
-        """Compute FOLLOW sets for all non-terminals"""
+        """Compute FOLLOW sets for all non-terminals (worklist algorithm)"""
         # Initialize
         for nt in self.non_terminals:
             self.follow[nt] = set()
@@ -282,54 +306,82 @@ class Grammar:
         # $ is in FOLLOW of start symbol
         self.follow[self.start_symbol].add('$')
 
-        # Iterate until no changes
-        changed = True
-        while changed:
-            changed = False
-            for non_terminal, productions in self.productions.items():
-                for production in productions:
-                    for i, symbol in enumerate(production):
-                        if symbol in self.non_terminals:
-                            old_size = len(self.follow[symbol])
-
-                            # Calculate FIRST of what comes after
-                            rest = production[i + 1:]
-                            if rest:
-                                first_of_rest = self.first_of_sequence(rest)
-                                self.follow[symbol].update(first_of_rest - {'epsilon'})
-                                if 'epsilon' in first_of_rest:
-                                    self.follow[symbol].update(self.follow[non_terminal])
-                            else:
-                                self.follow[symbol].update(self.follow[non_terminal])
-
-                            if len(self.follow[symbol]) > old_size:
-                                changed = True
+        # FIRST of what comes after a symbol is fixed; record where FOLLOW
+        # of the left-hand side must flow into FOLLOW of the symbol
+        follow_edges = defaultdict(set)
+        for non_terminal, productions in self.productions.items():
+            for production in productions:
+                for i, symbol in enumerate(production):
+                    if symbol in self.non_terminals:
+                        rest = production[i + 1:]
+                        if rest:
+                            first_of_rest = self.first_of_sequence(rest)
+                            self.follow[symbol].update(first_of_rest - {'epsilon'})
+                            if 'epsilon' in first_of_rest:
+                                follow_edges[non_terminal].add(symbol)
+                        else:
+                            follow_edges[non_terminal].add(symbol)
+
+        # Propagate along the edges, revisiting only FOLLOW sets that grew
+        worklist = deque(self.non_terminals)
+        queued = set(worklist)
+        while worklist:
+            non_terminal = worklist.popleft()
+            queued.discard(non_terminal)
+
+            for symbol in follow_edges[non_terminal]:
+                old_size = len(self.follow[symbol])
+                self.follow[symbol].update(self.follow[non_terminal])
+
+                if len(self.follow[symbol]) > old_size and symbol not in queued:
+                    worklist.append(symbol)
+                    queued.add(symbol)
 
     def build_parsing_table(self):
-        """Build LL(1) parsing table"""
+        """Build LL(1) parsing table, one row (terminal -> production) per non-terminal"""
         for non_terminal, productions in self.productions.items():
+            row = self.parsing_table.setdefault(non_terminal, {})
             for prod_idx, production in enumerate(productions):
                 # For each terminal in FIRST(production)
                 first_of_prod = self.first_of_sequence(production)
 
                 for terminal in first_of_prod:
                     if terminal != 'epsilon':
-                        key = (non_terminal, terminal)
-                        if key in self.parsing_table:
-                            print(f"Warning: Grammar is not LL(1) - conflict at {key}")
-                        self.parsing_table[key] = (prod_idx, production)
+                        if terminal in row:
+                            print(f"Warning: Grammar is not LL(1) - conflict at {(non_terminal, terminal)}")
+                        row[terminal] = (prod_idx, production)
 
                 # If epsilon in FIRST(production), add for FOLLOW terminals
                 if 'epsilon' in first_of_prod:
                     for terminal in self.follow[non_terminal]:
-                        key = (non_terminal, terminal)
-                        if key in self.parsing_table:
-                            print(f"Warning: Grammar is not LL(1) - conflict at {key}")
-                        self.parsing_table[key] = (prod_idx, production)
+                        if terminal in row:
+                            print(f"Warning: Grammar is not LL(1) - conflict at {(non_terminal, terminal)}")
+                        row[terminal] = (prod_idx, production)
+
+    def build_id_table(self):
+        """
+        Number the symbols (terminals first, epsilon excluded) and build
+        id_table[non_terminal_id - num_terminals][terminal_id], one extra
+        column for token types unknown to the grammar. Each entry is
+        (non_terminal, production, ids to push in reverse order) or None
+        """
+        terminals = sorted(self.terminals - {'epsilon'})
+        self.symbols = terminals + sorted(self.non_terminals)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.num_terminals = len(terminals)
+
+        for non_terminal in self.symbols[self.num_terminals:]:
+            id_row = [None] * (self.num_terminals + 1)
+            for terminal, (prod_idx, production) in self.parsing_table.get(non_terminal, {}).items():
+                push_ids = tuple(self.symbol_ids[symbol] for symbol in reversed(production)
+                                 if symbol != 'epsilon')
+                id_row[self.symbol_ids[terminal]] = (non_terminal, production, push_ids)
+            self.id_table.append(id_row)
 
     def get_production(self, non_terminal, terminal):
         """Get production from parsing table"""
-        return self.parsing_table.get((non_terminal, terminal))
+        row = self.parsing_table.get(non_terminal)
+        return row.get(terminal) if row else None
 
 
 # ============================================================================
@@ -338,6 +390,7 @@ class Grammar:
 
 class TreeNode:
     """Node in parse tree with father-sibling representation"""
+    __slots__ = ('id', 'symbol', 'value', 'father', 'sibling', 'child', 'last_child')
     node_counter = 0
 
     def __init__(self, symbol, value=None):
@@ -348,6 +401,7 @@ class TreeNode:
         self.father = None  # Parent node
         self.sibling = None  # Right sibling
         self.child = None  # Leftmost child
+        self.last_child = None  # Rightmost child, so appending is O(1)
 
     def add_child(self, child_node):
         """Add a child to this node"""
@@ -355,11 +409,9 @@ class TreeNode:
         if self.child is None:
             self.child = child_node
         else:
-            # Add as sibling to existing children
-            current = self.child
-            while current.sibling is not None:
-                current = current.sibling
-            current.sibling = child_node
+            # Add as sibling of the last child
+            self.last_child.sibling = child_node
+        self.last_child = child_node
 
     def __repr__(self):
         if self.value:
@@ -376,109 +428,161 @@ class LL1Parser:
 
     def __init__(self, grammar):
         self.grammar = grammar
-        self.stack = []
+        self.symbol_stack = []  # grammar symbol ids
         self.input_tokens = []
         self.input_index = 0
         self.parse_tree_root = None
-        self.productions_used = []
+        self.productions_used = []  # (non_terminal, production) in derivation order
+        self.matched_values = []  # values of the matched terminals, in input order
 
-    def parse(self, pif):
-        """Parse PIF and build parse tree"""
-        TreeNode.node_counter = 0  # Reset counter
+    def parse(self, pif, verbose=False):
+        """Parse PIF and build parse tree (prints the parsing trace if verbose)"""
+        self.parse_to_productions(pif, verbose)
+        return self.build_tree()
+
+    def parse_to_productions(self, pif, verbose=False):
+        """Run the LL(1) algorithm on PIF and record the productions applied"""
         self.input_tokens = pif
         self.input_index = 0
         self.productions_used = []
+        self.matched_values = []
+
+        # Token types and stack symbols are compared as integer ids
+        grammar = self.grammar
+        symbols = grammar.symbols
+        num_terminals = grammar.num_terminals
+        end_id = grammar.symbol_ids['$']
+        input_ids = [grammar.symbol_ids.get(token.type, num_terminals) for token in pif]
 
         # Initialize stack with start symbol
-        root = TreeNode(self.grammar.start_symbol)
-        self.parse_tree_root = root
-        self.stack = [('$', None), (self.grammar.start_symbol, root)]
+        self.symbol_stack = [end_id, grammar.symbol_ids[grammar.start_symbol]]
 
-        print("\n" + "=" * 80)
-        print("LL(1) PARSING TRACE")
-        print("=" * 80)
-        print(f"{'Step':<6} {'Stack':<30} {'Input':<30} {'Action'}")
-        print("-" * 80)
+        if verbose:
+            print("\n" + "=" * 80)
+            print("LL(1) PARSING TRACE")
+            print("=" * 80)
+            print(f"{'Step':<6} {'Stack':<30} {'Input':<30} {'Action'}")
+            print("-" * 80)
 
+        # The loop only touches locals: bound methods and the input index
+        # are looked up once instead of once per step
         step = 0
-        while len(self.stack) > 0:
+        index = 0
+        tokens = self.input_tokens
+        symbol_stack = self.symbol_stack
+        pop = symbol_stack.pop
+        push_all = symbol_stack.extend
+        record_production = self.productions_used.append
+        record_value = self.matched_values.append
+        id_table = grammar.id_table
+        symbol_name = symbols.__getitem__
+        preview_index = -1
+        while symbol_stack:
             step += 1
 
             # Current stack top
-            top_symbol, top_node = self.stack[-1]
+            top_id = symbol_stack[-1]
 
             # Current input token
-            current_token = self.input_tokens[self.input_index]
+            current_id = input_ids[index]
 
-            # Display state
-            stack_str = ' '.join([s for s, _ in self.stack[-5:]])  # Show last 5
-            input_str = ' '.join([t.type for t in self.input_tokens[self.input_index:self.input_index + 3]])
+            # Display state (the input preview only changes after a match)
+            if verbose:
+                stack_str = ' '.join(map(symbol_name, symbol_stack[-5:]))  # Show last 5
+                if preview_index != index:
+                    input_str = ' '.join([t.type for t in tokens[index:index + 3]])
+                    preview_index = index
 
             # Match or expand
-            if top_symbol == current_token.type or (top_symbol == '$' and current_token.type == '$'):
+            if top_id == current_id:
                 # Match
-                action = f"Match {top_symbol}"
-                print(f"{step:<6} {stack_str:<30} {input_str:<30} {action}")
+                if verbose:
+                    action = f"Match {symbols[top_id]}"
+                    print(f"{step:<6} {stack_str:<30} {input_str:<30} {action}")
 
-                # Update tree node value if it's a terminal
-                if top_node and top_symbol != '$':
-                    top_node.value = current_token.value
+                # Remember the value for the terminal's tree node
+                if top_id != end_id:
+                    record_value(tokens[index].value)
 
-                self.stack.pop()
-                self.input_index += 1
+                pop()
+                index += 1
 
-            elif top_symbol == 'epsilon':
-                # Epsilon - just pop from stack
-                action = "Pop epsilon"
-                print(f"{step:<6} {stack_str:<30} {input_str:<30} {action}")
-                self.stack.pop()
-
-            elif top_symbol in self.grammar.non_terminals:
+            elif top_id >= num_terminals:
                 # Non-terminal - expand using parsing table
-                production = self.grammar.get_production(top_symbol, current_token.type)
+                entry = id_table[top_id - num_terminals][current_id]
 
-                if production is None:
+                if entry is None:
+                    self.input_index = index
+                    current_token = tokens[index]
                     raise Exception(f"Syntax error at position {current_token.position}: "
                                     f"Unexpected token {current_token.type} ('{current_token.value}')")
 
-                prod_idx, prod_symbols = production
-                action = f"Apply {top_symbol} -> {' '.join(prod_symbols)}"
-                print(f"{step:<6} {stack_str:<30} {input_str:<30} {action}")
+                non_terminal, prod_symbols, push_ids = entry
+                if verbose:
+                    action = f"Apply {non_terminal} -> {' '.join(prod_symbols)}"
+                    print(f"{step:<6} {stack_str:<30} {input_str:<30} {action}")
 
                 # Record production
-                self.productions_used.append(f"{top_symbol} -> {' '.join(prod_symbols)}")
+                record_production((non_terminal, prod_symbols))
 
-                # Pop non-terminal from stack
-                self.stack.pop()
+                # Pop non-terminal, push production symbols in reverse order
+                pop()
+                push_all(push_ids)
 
-                # Create child nodes and push to stack (in reverse order)
-                child_nodes = []
-                for symbol in prod_symbols:
-                    child_node = TreeNode(symbol)
-                    child_nodes.append(child_node)
-                    top_node.add_child(child_node)
+            else:
+                self.input_index = index
+                raise Exception(f"Unexpected symbol on stack: {symbols[top_id]}")
 
-                # Push children to stack in reverse order
-                for symbol, child_node in reversed(list(zip(prod_symbols, child_nodes))):
-                    if symbol != 'epsilon':
-                        self.stack.append((symbol, child_node))
+        self.input_index = index
 
-            else:
-                raise Exception(f"Unexpected symbol on stack: {top_symbol}")
+        if verbose:
+            print("=" * 80)
+            print("PARSING COMPLETED SUCCESSFULLY")
+            print("=" * 80)
 
-        print("=" * 80)
-        print("PARSING COMPLETED SUCCESSFULLY")
-        print("=" * 80)
+        return self.productions_used
+
+    def build_tree(self):
+        """Build the parse tree by replaying the recorded leftmost derivation"""
+        TreeNode.node_counter = 0  # Reset counter
+        productions = iter(self.productions_used)
+        values = iter(self.matched_values)
+
+        root = TreeNode(self.grammar.start_symbol)
+        self.parse_tree_root = root
+
+        # Nodes are expanded in the same order the parser expanded their symbols
+        node_stack = [root]
+        while node_stack:
+            node = node_stack.pop()
+
+            if node.symbol not in self.grammar.non_terminals:
+                node.value = next(values)
+                continue
+
+            non_terminal, prod_symbols = next(productions)
+
+            # Create child nodes
+            child_nodes = []
+            for symbol in prod_symbols:
+                child_node = TreeNode(symbol)
+                child_nodes.append(child_node)
+                node.add_child(child_node)
+
+            # Push children to stack in reverse order
+            for i in range(len(prod_symbols) - 1, -1, -1):
+                if prod_symbols[i] != 'epsilon':
+                    node_stack.append(child_nodes[i])
 
-        return self.parse_tree_root
+        return root
 
     def print_productions(self):
         """Print productions used during parsing"""
         print("\n" + "=" * 80)
         print("PRODUCTIONS USED (Derivation)")
         print("=" * 80)
-        for i, prod in enumerate(self.productions_used, 1):
-            print(f"{i:3}. {prod}")
+        for i, (non_terminal, production) in enumerate(self.productions_used, 1):
+            print(f"{i:3}. {non_terminal} -> {' '.join(production)}")
 
     def print_parse_tree_table(self):
         """Print parse tree in father-sibling table format"""
@@ -490,10 +594,10 @@ class LL1Parser:
 
         # Collect all nodes using BFS
         nodes = []
-        queue = [self.parse_tree_root]
+        queue = deque([self.parse_tree_root])
 
         while queue:
-            node = queue.pop(0)
+            node = queue.popleft()
             nodes.append(node)
 
             # Add children to queue
@@ -548,7 +652,7 @@ def main():
                 print(f"  {token}")
 
             # Parse
-            parse_tree = parser.parse(pif)
+            parse_tree = parser.parse(pif, verbose=True)
 
             # Output
             parser.print_productions()
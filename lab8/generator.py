@@ -3,8 +3,56 @@ C Code Generator for Unit Conversion Language
 Translates DSL source code to executable C code
 """
 
+import argparse
+import io
 import re
-from collections import defaultdict
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from pathlib import Path
+
+
+# Unit conversion factors (to the base unit of each category)
+UNIT_CONVERSIONS = {
+    # Weight conversions to grams
+    'mg': 0.001, 'cg': 0.01, 'dg': 0.1, 'g': 1,
+    'dag': 10, 'hg': 100, 'kg': 1000, 't': 1000000,
+    # Distance conversions to meters
+    'mm': 0.001, 'cm': 0.01, 'dm': 0.1, 'm': 1,
+    'dam': 10, 'hm': 100, 'km': 1000,
+    # Time conversions to seconds
+    'ms': 0.001, 's': 1, 'min': 60, 'hr': 3600,
+    'd': 86400, 'wk': 604800, 'mo': 2592000, 'yr': 31536000,
+    # Fluid conversions to liters
+    'ml': 0.001, 'cl': 0.01, 'dl': 0.1, 'l': 1
+}
+
+UNIT_CATEGORIES = {
+    'weight': ['mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'],
+    'distance': ['mm', 'cm', 'dm', 'm', 'dam', 'hm', 'km'],
+    'time': ['ms', 's', 'min', 'hr', 'd', 'wk', 'mo', 'yr'],
+    'fluid': ['ml', 'cl', 'dl', 'l']
+}
+
+# Category of each unit, so finding it is a single lookup
+UNIT_TO_CATEGORY = {
+    unit: category for category, units in UNIT_CATEGORIES.items() for unit in units
+}
+
+# Binary operator precedence (all left associative)
+BINARY_PRECEDENCE = {'PLUS': 1, 'MINUS': 1, 'MULTIPLY': 2, 'DIVIDE': 2}
+
+# Comparison token type -> C operator
+COMPARISON_OPS = {
+    'EQ': '==', 'NE': '!=', 'GT': '>',
+    'LT': '<', 'GE': '>=', 'LE': '<='
+}
+
+# Invariant start and end of every generated program, written in one go
+C_HEADER = "#include <stdio.h>\n#include <stdlib.h>\n\nint main() {\n"
+C_FOOTER = "    return 0;\n}\n"
 
 
 # ============================================================================
@@ -12,6 +60,8 @@ from collections import defaultdict
 # ============================================================================
 
 class Token:
+    __slots__ = ('type', 'value', 'position')
+
     def __init__(self, token_type, value, position):
         self.type = token_type
         self.value = value
@@ -35,8 +85,13 @@ class Scanner:
             'mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'
         }
 
+        # Keywords and units end where an identifier would end
+        word_end = r'(?![a-zA-Z0-9])'
+
         self.patterns = [
-            ('NUMBER', r'-?\d+'),
+            ('NUMBER', r'\d+'),
+            *[(keyword.upper(), keyword + word_end) for keyword in sorted(self.keywords)],
+            ('UNIT', '(?:' + '|'.join(sorted(self.units)) + ')' + word_end),
             ('IDENTIFIER', r'[a-zA-Z][a-zA-Z0-9]*'),
             ('EQ', r'=='),
             ('NE', r'!='),
@@ -59,39 +114,36 @@ class Scanner:
             ('WHITESPACE', r'\s+'),
         ]
 
+        # One master regex: the alternation is tried in pattern order and
+        # the name of the group that matched is the token type
+        self.master = re.compile('|'.join(f'(?P<{token_type}>{pattern})' for token_type, pattern in self.patterns))
+
     def scan(self, source_code):
         """Scan source and return PIF"""
         pif = []
         position = 0
 
-        while position < len(source_code):
-            matched = False
-
-            for token_type, pattern in self.patterns:
-                regex = re.compile(pattern)
-                match = regex.match(source_code, position)
+        # Matches must be contiguous; a gap means an illegal character
+        for match in self.master.finditer(source_code):
+            if match.start() != position:
+                break
 
-                if match:
-                    value = match.group(0)
+            token_type = match.lastgroup
+            value = match.group(0)
+            position = match.end()
 
-                    if token_type == 'WHITESPACE':
-                        position = match.end()
-                        matched = True
-                        break
+            if token_type == 'WHITESPACE':
+                continue
 
-                    if token_type == 'IDENTIFIER':
-                        if value in self.keywords:
-                            token_type = value.upper()
-                        elif value in self.units:
-                            token_type = 'UNIT'
+            # Repeated names share one string object, so the generator's
+            # variable set compares them by identity
+            if token_type == 'IDENTIFIER':
+                value = sys.intern(value)
 
-                    pif.append(Token(token_type, value, position))
-                    position = match.end()
-                    matched = True
-                    break
+            pif.append(Token(token_type, value, match.start()))
 
-            if not matched:
-                raise Exception(f"Illegal character at position {position}: '{source_code[position]}'")
+        if position < len(source_code):
+            raise Exception(f"Illegal character at position {position}: '{source_code[position]}'")
 
         return pif
 
@@ -107,19 +159,7 @@ class SimpleParser:
         self.tokens = tokens
         self.pos = 0
         self.variables = set()
-        self.unit_conversions = {
-            # Weight conversions to grams
-            'mg': 0.001, 'cg': 0.01, 'dg': 0.1, 'g': 1,
-            'dag': 10, 'hg': 100, 'kg': 1000, 't': 1000000,
-            # Distance conversions to meters
-            'mm': 0.001, 'cm': 0.01, 'dm': 0.1, 'm': 1,
-            'dam': 10, 'hm': 100, 'km': 1000,
-            # Time conversions to seconds
-            'ms': 0.001, 's': 1, 'min': 60, 'hr': 3600,
-            'd': 86400, 'wk': 604800, 'mo': 2592000, 'yr': 31536000,
-            # Fluid conversions to liters
-            'ml': 0.001, 'cl': 0.01, 'dl': 0.1, 'l': 1
-        }
+        self.unit_conversions = UNIT_CONVERSIONS
 
     def current_token(self):
         if self.pos < len(self.tokens):
@@ -149,33 +189,39 @@ class CCodeGenerator:
 
     def __init__(self):
         self.scanner = Scanner()
-        self.c_code = []
+        self.c_buf = io.StringIO()
         self.indent_level = 0
         self.variables = set()
         self.arrays = set()
 
         # Unit conversion factors (to base unit)
-        self.conversions = {
-            'mg': 0.001, 'cg': 0.01, 'dg': 0.1, 'g': 1,
-            'dag': 10, 'hg': 100, 'kg': 1000, 't': 1000000,
-            'mm': 0.001, 'cm': 0.01, 'dm': 0.1, 'm': 1,
-            'dam': 10, 'hm': 100, 'km': 1000,
-            'ms': 0.001, 's': 1, 'min': 60, 'hr': 3600,
-            'd': 86400, 'wk': 604800, 'mo': 2592000, 'yr': 31536000,
-            'ml': 0.001, 'cl': 0.01, 'dl': 0.1, 'l': 1
+        self.conversions = UNIT_CONVERSIONS
+
+        # Statement parser for each leading token type
+        self.statement_parsers = {
+            'IDENTIFIER': self.parse_assignment,
+            'CONVERT': self.parse_conversion,
+            'PRINT': self.parse_print,
+            'IF': self.parse_if,
+            'FOR': self.parse_for
         }
 
-        self.unit_categories = {
-            'weight': ['mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'],
-            'distance': ['mm', 'cm', 'dm', 'm', 'dam', 'hm', 'km'],
-            'time': ['ms', 's', 'min', 'hr', 'd', 'wk', 'mo', 'yr'],
-            'fluid': ['ml', 'cl', 'dl', 'l']
-        }
+    @property
+    def indent_level(self):
+        return self._indent_level
+
+    @indent_level.setter
+    def indent_level(self, level):
+        # The indent string is rebuilt only when the level changes, not per line
+        self._indent_level = level
+        self.indent_str = "    " * level
 
     def emit(self, code):
         """Emit C code with proper indentation"""
-        indent = "    " * self.indent_level
-        self.c_code.append(indent + code)
+        write = self.c_buf.write
+        write(self.indent_str)
+        write(code)
+        write("\n")
 
     def generate(self, source_code):
         """Main generation function"""
@@ -183,62 +229,51 @@ class CCodeGenerator:
         self.tokens = tokens
         self.pos = 0
 
+        # Token types in their own list (None-terminated), so the type tests
+        # that drive parsing are a plain index instead of a token attribute
+        self.token_types = [token.type for token in tokens]
+        self.token_types.append(None)
+
         # Generate C code
-        self.emit("#include <stdio.h>")
-        self.emit("#include <stdlib.h>")
-        self.emit("")
-        self.emit("int main() {")
-        self.indent_level += 1
+        self.c_buf.write(C_HEADER)
+        self.indent_level = 1
 
         # Parse program
         self.parse_program()
 
-        self.emit("return 0;")
-        self.indent_level -= 1
-        self.emit("}")
-
-        return "\n".join(self.c_code)
+        self.indent_level = 0
+        self.c_buf.write(C_FOOTER)
 
-    def current_token(self):
-        if self.pos < len(self.tokens):
-            return self.tokens[self.pos]
-        return None
+        # Every line ends in a newline; drop the last one
+        return self.c_buf.getvalue()[:-1]
 
     def consume(self, expected_type=None):
-        token = self.current_token()
-        if token is None:
+        token_type = self.token_types[self.pos]
+        if token_type is None:
             return None
-        if expected_type and token.type != expected_type:
-            raise Exception(f"Expected {expected_type}, got {token.type}")
+        if expected_type and token_type != expected_type:
+            raise Exception(f"Expected {expected_type}, got {token_type}")
         self.pos += 1
-        return token
+        return self.tokens[self.pos - 1]
 
     def peek(self, expected_type):
-        token = self.current_token()
-        return token and token.type == expected_type
+        return self.token_types[self.pos] == expected_type
 
     def parse_program(self):
         """Parse entire program"""
-        while self.current_token():
+        while self.token_types[self.pos] is not None:
             self.parse_statement()
 
     def parse_statement(self):
         """Parse a statement"""
-        token = self.current_token()
+        token_type = self.token_types[self.pos]
 
-        if not token:
+        if token_type is None:
             return
 
-        if token.type == 'IDENTIFIER':
-            self.parse_assignment()
-        elif token.type == 'CONVERT':
-            self.parse_conversion()
-        elif token.type == 'PRINT':
-            self.parse_print()
-        elif token.type == 'IF':
-            self.parse_if()
-        elif token.type == 'FOR':
-            self.parse_for()
+        parse = self.statement_parsers.get(token_type)
+        if parse:
+            parse()
         else:
             self.pos += 1  # Skip unknown token
 
@@ -250,8 +285,10 @@ class CCodeGenerator:
         expr, has_unit = self.parse_expression()
 
         # Declare variable if first use
-        if var_name not in self.variables:
-            self.variables.add(var_name)
+        # (one hash probe: add() grows the set only for a new name)
+        declared = len(self.variables)
+        self.variables.add(var_name)
+        if len(self.variables) != declared:
             self.emit(f"double {var_name};")
 
         self.emit(f"{var_name} = {expr};")
@@ -264,11 +301,7 @@ class CCodeGenerator:
         target_unit = self.consume('UNIT').value
 
         # Find which category this unit belongs to
-        category = None
-        for cat, units in self.unit_categories.items():
-            if target_unit in units:
-                category = cat
-                break
+        category = UNIT_TO_CATEGORY.get(target_unit)
 
         if category:
             conversion_factor = self.conversions[target_unit]
@@ -338,8 +371,7 @@ class CCodeGenerator:
         self.emit(f"int {array_name}_size = {len(list_items)};")
 
         # Generate loop
-        if loop_var not in self.variables:
-            self.variables.add(loop_var)
+        self.variables.add(loop_var)
 
         self.emit(f"for (int i = 0; i < {array_name}_size; i++) {{")
         self.indent_level += 1
@@ -357,100 +389,149 @@ class CCodeGenerator:
         """Parse: expression comparison_op expression"""
         left, _ = self.parse_expression()
 
-        op_token = self.current_token()
-        if op_token.type in ['EQ', 'NE', 'GT', 'LT', 'GE', 'LE']:
-            op_map = {
-                'EQ': '==', 'NE': '!=', 'GT': '>',
-                'LT': '<', 'GE': '>=', 'LE': '<='
-            }
-            op = op_map[op_token.type]
-            self.consume()
+        op_type = self.token_types[self.pos]
+        if op_type in COMPARISON_OPS:
+            op = COMPARISON_OPS[op_type]
+            self.pos += 1
         else:
-            raise Exception(f"Expected comparison operator, got {op_token.type}")
+            raise Exception(f"Expected comparison operator, got {op_type}")
 
         right, _ = self.parse_expression()
 
         return f"{left} {op} {right}"
 
     def parse_expression(self):
-        """Parse: term [(+|-) term]*"""
-        result, has_unit = self.parse_term()
-
-        while self.peek('PLUS') or self.peek('MINUS'):
-            op = self.consume()
-            term, _ = self.parse_term()
-            result = f"({result} {op.value} {term})"
-
-        return result, has_unit
-
-    def parse_term(self):
-        """Parse: factor [(*|/) factor]*"""
-        result, has_unit = self.parse_factor()
-
-        while self.peek('MULTIPLY') or self.peek('DIVIDE'):
-            op = self.consume()
-            factor, _ = self.parse_factor()
-            result = f"({result} {op.value} {factor})"
+        """
+        Parse: factor [(+|-|*|/) factor]* by operator precedence
+        Operands and operators are kept on explicit stacks, so an operand
+        costs one parse_factor call instead of a parse_term/parse_factor pair
+        """
+        operand, has_unit = self.parse_factor()
+        operands = [operand]
+        operators = []  # (precedence, operator)
+
+        token_types = self.token_types
+        while True:
+            precedence = BINARY_PRECEDENCE.get(token_types[self.pos])
+            if precedence is None:
+                break
+            op = self.tokens[self.pos].value
+            self.pos += 1
+
+            # Left associative: fold pending operators of equal or higher precedence
+            while operators and operators[-1][0] >= precedence:
+                pending = operators.pop()[1]
+                right = operands.pop()
+                operands[-1] = (pending, operands[-1], right)
+
+            operators.append((precedence, op))
+            operand, _ = self.parse_factor()
+            operands.append(operand)
+
+        while operators:
+            op = operators.pop()[1]
+            right = operands.pop()
+            operands[-1] = (op, operands[-1], right)
+
+        result = operands[0]
+        if isinstance(result, str):
+            return result, has_unit
+
+        # Render the (op, left, right) tree as ((a + b) * c) with a single join
+        parts = []
+        stack = [result]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            else:
+                op, left, right = item
+                stack.extend((")", right, f" {op} ", left, "("))
 
-        return result, has_unit
+        return "".join(parts), has_unit
 
     def parse_factor(self):
-        """Parse: number [unit] | identifier | (expression)"""
-        token = self.current_token()
+        """Parse: number [unit] | identifier | (expression) | - factor"""
+        token_type = self.token_types[self.pos]
+
+        if token_type == 'MINUS':
+            # Unary minus (the scanner no longer folds '-' into NUMBER)
+            self.consume('MINUS')
+            operand, has_unit = self.parse_factor()
+            return f"(-{operand})", has_unit
 
-        if token.type == 'NUMBER':
+        elif token_type == 'NUMBER':
             num = self.consume().value
 
             # Check for unit
             if self.peek('UNIT'):
                 unit = self.consume('UNIT').value
-                # Convert to base unit
+                # Convert to base unit at generation time; an integer factor
+                # keeps the literal an int, as num * factor would be in C
                 factor = self.conversions.get(unit, 1)
-                return f"({num} * {factor})", True
+                if isinstance(factor, int):
+                    value = int(num) * factor
+                else:
+                    value = float(num) * factor
+                return f"{value!r} /* {num} {unit} */", True
 
             return num, False
 
-        elif token.type == 'IDENTIFIER':
+        elif token_type == 'IDENTIFIER':
             var_name = self.consume().value
             return var_name, False
 
-        elif token.type == 'LPAREN':
+        elif token_type == 'LPAREN':
             self.consume('LPAREN')
             expr, has_unit = self.parse_expression()
             self.consume('RPAREN')
             return f"({expr})", has_unit
 
         else:
-            raise Exception(f"Unexpected token in factor: {token.type}")
+            raise Exception(f"Unexpected token in factor: {token_type}")
+
+
+@lru_cache(maxsize=256)
+def generate_c_code(source_code):
+    """Generate C code for source_code with a fresh generator (results are cached per source)"""
+    return CCodeGenerator().generate(source_code)
 
 
 # ============================================================================
 # VALIDATION AND TESTING
 # ============================================================================
 
+# Required C syntax elements, and the brackets that must balance
+REQUIRED_ELEMENTS_RE = re.compile(r'#include <stdio\.h>|int main\(\)|return 0;')
+BRACKETS_RE = re.compile(r'[{}()]')
+
+
 def validate_c_code(c_code):
-    """Validate generated C code"""
+    """Validate generated C code (one scan for the elements, one for the brackets)"""
     issues = []
 
     # Check for basic C syntax elements
-    if "#include <stdio.h>" not in c_code:
+    found = set(REQUIRED_ELEMENTS_RE.findall(c_code))
+    if "#include <stdio.h>" not in found:
         issues.append("Missing stdio.h include")
 
-    if "int main()" not in c_code:
+    if "int main()" not in found:
         issues.append("Missing main function")
 
-    if "return 0;" not in c_code:
+    if "return 0;" not in found:
         issues.append("Missing return statement in main")
 
+    counts = Counter(BRACKETS_RE.findall(c_code))
+
     # Check for balanced braces
-    open_braces = c_code.count('{')
-    close_braces = c_code.count('}')
+    open_braces = counts['{']
+    close_braces = counts['}']
     if open_braces != close_braces:
         issues.append(f"Unbalanced braces: {open_braces} open, {close_braces} close")
 
     # Check for balanced parentheses
-    open_parens = c_code.count('(')
-    close_parens = c_code.count(')')
+    open_parens = counts['(']
+    close_parens = counts[')']
     if open_parens != close_parens:
         issues.append(f"Unbalanced parentheses: {open_parens} open, {close_parens} close")
 
@@ -510,8 +591,14 @@ def compile_and_run_c(c_code, test_name):
 # MAIN TEST PROGRAM
 # ============================================================================
 
-def main():
-    """Test C code generation"""
+def main(argv=None):
+    """Test C code generation (in memory unless files or compilation are asked for)"""
+    arg_parser = argparse.ArgumentParser(description="Generate C code for the test programs")
+    arg_parser.add_argument('--emit-files', action='store_true',
+                            help="save each generated program as <test>.c")
+    arg_parser.add_argument('--compile', action='store_true',
+                            help="compile and run each generated program with gcc")
+    args = arg_parser.parse_args(argv)
 
     test_programs = [
         ("simple_assignment", "x = 5 kg\nprint x"),
@@ -522,51 +609,59 @@ def main():
         ("for_loop", "for i in [1, 2, 3] do {\n    print i\n}"),
     ]
 
-    generator = CCodeGenerator()
-
-    for test_name, dsl_code in test_programs:
-        print("\n" + "=" * 80)
-        print(f"TEST: {test_name}")
-        print("=" * 80)
-        print("DSL Code:")
-        print(dsl_code)
-        print("\n" + "-" * 80)
-
-        try:
-            # Generate C code
-            c_code = generator.generate(dsl_code)
-
-            print("Generated C Code:")
-            print("-" * 80)
-            print(c_code)
-
-            # Validate
+    # Generated files are written on a thread pool while the next test runs
+    saves = []
+    with ThreadPoolExecutor() if args.emit_files else nullcontext() as executor:
+        for test_name, dsl_code in test_programs:
+            print("\n" + "=" * 80)
+            print(f"TEST: {test_name}")
+            print("=" * 80)
+            print("DSL Code:")
+            print(dsl_code)
             print("\n" + "-" * 80)
-            print("Validation:")
-            print("-" * 80)
-            issues = validate_c_code(c_code)
-            if issues:
-                print("⚠ Issues found:")
-                for issue in issues:
-                    print(f"  - {issue}")
-            else:
-                print("✓ No issues found")
-
-            # Save to file
-            with open(f"{test_name}.c", 'w') as f:
-                f.write(c_code)
-            print(f"✓ Saved to {test_name}.c")
-
-            # Try to compile and run (optional)
-            # compile_and_run_c(c_code, test_name)
 
+            try:
+                # Generate C code
+                c_code = generate_c_code(dsl_code)
+
+                print("Generated C Code:")
+                print("-" * 80)
+                print(c_code)
+
+                # Validate
+                print("\n" + "-" * 80)
+                print("Validation:")
+                print("-" * 80)
+                issues = validate_c_code(c_code)
+                if issues:
+                    print("⚠ Issues found:")
+                    for issue in issues:
+                        print(f"  - {issue}")
+                else:
+                    print("✓ No issues found")
+
+                # Save to file (optional)
+                if args.emit_files:
+                    filename = f"{test_name}.c"
+                    saves.append((filename, executor.submit(Path(filename).write_text, c_code)))
+
+                # Compile and run (optional)
+                if args.compile:
+                    compile_and_run_c(c_code, test_name)
+
+            except Exception as e:
+                print(f"ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+
+    # The pool has finished every write; report each one only now
+    for filename, save in saves:
+        try:
+            save.result()
         except Exception as e:
-            print(f"ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-
-        # Reset generator for next test
-        generator = CCodeGenerator()
+            print(f"ERROR: could not save {filename}: {e}")
+        else:
+            print(f"✓ Saved to {filename}")
 
 
 if __name__ == "__main__":
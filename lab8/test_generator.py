@@ -0,0 +1,22 @@
+"""
+Tests for the C code generator
+"""
+
+import unittest
+
+from generator import generate_c_code
+
+
+class TestUnitFolding(unittest.TestCase):
+
+    def test_integer_factor_folds_to_int_literal(self):
+        # (10 * 1000) / 3 is integer division in C; the folded literal keeps it
+        self.assertIn("x = (10000 /* 10 kg */ / 3);", generate_c_code("x = 10 kg / 3"))
+        self.assertIn("x = (10 /* 10 m */ / 4);", generate_c_code("x = 10 m / 4"))
+
+    def test_fractional_factor_folds_to_double_literal(self):
+        self.assertIn("x = 0.005 /* 5 mg */;", generate_c_code("x = 5 mg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Tests for the YACC translator: generated C must compile and keep C semantics
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from translator_yacc import translate_to_c
+
+
+IF_ELSE = "x = 5\nif x > 10 then {\n    y = 1\n} else {\n    y = 0\n}\nprint y"
+
+
+class TestBlockDeclarations(unittest.TestCase):
+
+    def test_first_use_in_block_is_declared_in_main(self):
+        c_code = translate_to_c(IF_ELSE)
+        lines = c_code.splitlines()
+        self.assertEqual(lines.count("    double y;"), 1)
+        self.assertLess(lines.index("    double y;"), lines.index("    if (x > 10) {"))
+
+    @unittest.skipUnless(shutil.which("gcc"), "gcc not available")
+    def test_if_else_compiles(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "if_else_yacc.c")
+            with open(source, "w") as f:
+                f.write(translate_to_c(IF_ELSE))
+            result = subprocess.run(["gcc", "-fsyntax-only", source],
+                                    capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class TestUnitFolding(unittest.TestCase):
+
+    def test_integer_factor_folds_to_int_literal(self):
+        # (10 * 1000) / 3 is integer division in C; the folded literal keeps it
+        self.assertIn("x = (10000 /* 10 kg */ / 3);", translate_to_c("x = 10 kg / 3"))
+        self.assertIn("x = (10 /* 10 m */ / 4);", translate_to_c("x = 10 m / 4"))
+
+    def test_fractional_factor_folds_to_double_literal(self):
+        self.assertIn("x = 0.005 /* 5 mg */;", translate_to_c("x = 5 mg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,58 @@
 """
 YACC/PLY Parser with C Code Generation
 Translates Unit Conversion DSL to C
+Lexer uses a precompiled master regex, parser uses PLY (Python Lex-Yacc)
 """
 
-import ply.lex as lex
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from pathlib import Path
+
 import ply.yacc as yacc
 
+# Generated LALR tables are written next to this file and reloaded on later builds
+TABLE_MODULE = 'lab8_parsetab'
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Unit conversion factors (to the base unit of each category)
+UNIT_CONVERSIONS = {
+    'mg': 0.001, 'cg': 0.01, 'dg': 0.1, 'g': 1,
+    'dag': 10, 'hg': 100, 'kg': 1000, 't': 1000000,
+    'mm': 0.001, 'cm': 0.01, 'dm': 0.1, 'm': 1,
+    'dam': 10, 'hm': 100, 'km': 1000,
+    'ms': 0.001, 's': 1, 'min': 60, 'hr': 3600,
+    'd': 86400, 'wk': 604800, 'mo': 2592000, 'yr': 31536000,
+    'ml': 0.001, 'cl': 0.01, 'dl': 0.1, 'l': 1
+}
+
+# Invariant start and end of every generated program (lines are joined with newlines)
+C_HEADER = "#include <stdio.h>\n#include <stdlib.h>\n\nint main() {"
+C_FOOTER = "    return 0;\n}"
+
 
 # ============================================================================
 # LEXER
 # ============================================================================
 
+class LexToken:
+    """Token handed to the yacc parser (same fields as ply.lex.LexToken)"""
+
+    def __init__(self, token_type, value, lineno, lexpos):
+        self.type = token_type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __repr__(self):
+        return f"LexToken({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
 class Lexer:
     """Lexer with FA for identifiers and constants"""
 
@@ -59,56 +101,77 @@ class Lexer:
         'mg', 'cg', 'dg', 'g', 'dag', 'hg', 'kg', 't'
     }
 
-    t_PLUS = r'\+'
-    t_MULTIPLY = r'\*'
-    t_DIVIDE = r'/'
-    t_ASSIGN = r'='
-    t_LPAREN = r'\('
-    t_RPAREN = r'\)'
-    t_LBRACE = r'\{'
-    t_RBRACE = r'\}'
-    t_LBRACKET = r'\['
-    t_RBRACKET = r'\]'
-    t_COMMA = r','
-    t_EQUAL = r'=='
-    t_NOT_EQUAL = r'!='
-    t_GREATER_EQUAL = r'>='
-    t_LESS_EQUAL = r'<='
-    t_GREATER = r'>'
-    t_LESS = r'<'
-    t_ignore = ' \t'
+    # Token type of every reserved word and unit, for identifier reclassification
+    kw_unit = {**reserved, **{unit: 'UNIT' for unit in units}}
+
+    # Token rules in match order (two character operators before one character ones)
+    token_rules = [
+        ('newline', r'\n+'),
+        ('ignore', r'[ \t]+'),
+        ('MINUS', r'-'),
+        ('NUMBER', r'0|[1-9][0-9]*'),
+        ('IDENTIFIER', r'[a-zA-Z][a-zA-Z0-9]*'),
+        ('EQUAL', r'=='),
+        ('NOT_EQUAL', r'!='),
+        ('GREATER_EQUAL', r'>='),
+        ('LESS_EQUAL', r'<='),
+        ('PLUS', r'\+'),
+        ('MULTIPLY', r'\*'),
+        ('DIVIDE', r'/'),
+        ('ASSIGN', r'='),
+        ('LPAREN', r'\('),
+        ('RPAREN', r'\)'),
+        ('LBRACE', r'\{'),
+        ('RBRACE', r'\}'),
+        ('LBRACKET', r'\['),
+        ('RBRACKET', r'\]'),
+        ('COMMA', r','),
+        ('GREATER', r'>'),
+        ('LESS', r'<'),
+        ('error', r'.'),  # anything else is an illegal character
+    ]
+
+    # Master pattern: one alternation, the matching rule is m.lastgroup
+    master_pattern = re.compile('|'.join(f'(?P<{name}>{regex})' for name, regex in token_rules))
 
     def __init__(self):
-        self.lexer = None
+        self.lineno = 1
+        self.matches = iter(())
 
-    def t_newline(self, t):
-        r'\n+'
-        t.lexer.lineno += len(t.value)
+    def input(self, data):
+        """Start lexing a new input string (called by yacc)"""
+        self.lineno = 1
+        self.matches = self.master_pattern.finditer(data)
 
-    def t_MINUS(self, t):
-        r'-'
-        return t
+    def token(self):
+        """Return the next token, or None at end of input (called by yacc)"""
+        for m in self.matches:
+            kind = m.lastgroup
+            value = m.group()
 
-    def t_NUMBER(self, t):
-        r'0|[1-9][0-9]*'
-        t.value = int(t.value)
-        return t
+            if kind == 'ignore':
+                continue
 
-    def t_IDENTIFIER(self, t):
-        r'[a-zA-Z][a-zA-Z0-9]*'
-        if t.value in self.reserved:
-            t.type = self.reserved[t.value]
-        elif t.value in self.units:
-            t.type = 'UNIT'
-        return t
+            if kind == 'newline':
+                self.lineno += len(value)
+                continue
 
-    def t_error(self, t):
-        print(f"Illegal character '{t.value[0]}'")
-        t.lexer.skip(1)
+            if kind == 'IDENTIFIER':
+                # Reserved keyword, unit or plain identifier (names are
+                # interned so the variable set compares them by identity)
+                value = sys.intern(value)
+                kind = self.kw_unit.get(value, 'IDENTIFIER')
 
-    def build(self):
-        self.lexer = lex.lex(module=self)
-        return self.lexer
+            elif kind == 'NUMBER':
+                value = int(value)
+
+            elif kind == 'error':
+                print(f"Illegal character '{value}'")
+                continue
+
+            return LexToken(kind, value, self.lineno, m.start())
+
+        return None
 
 
 # ============================================================================
@@ -120,7 +183,6 @@ class CCodeGenParser:
 
     def __init__(self):
         self.lexer = Lexer()
-        self.lexer.build()
         self.tokens = self.lexer.tokens
         self.parser = None
 
@@ -128,29 +190,16 @@ class CCodeGenParser:
         self.c_code = []
         self.indent_level = 0
         self.variables = set()
-        self.temp_var_counter = 0
+        self.block_stack = []  # enclosing code buffers while a block is parsed
 
         # Unit conversions
-        self.conversions = {
-            'mg': 0.001, 'cg': 0.01, 'dg': 0.1, 'g': 1,
-            'dag': 10, 'hg': 100, 'kg': 1000, 't': 1000000,
-            'mm': 0.001, 'cm': 0.01, 'dm': 0.1, 'm': 1,
-            'dam': 10, 'hm': 100, 'km': 1000,
-            'ms': 0.001, 's': 1, 'min': 60, 'hr': 3600,
-            'd': 86400, 'wk': 604800, 'mo': 2592000, 'yr': 31536000,
-            'ml': 0.001, 'cl': 0.01, 'dl': 0.1, 'l': 1
-        }
+        self.conversions = UNIT_CONVERSIONS
 
     def emit(self, code):
         """Emit C code with indentation"""
         indent = "    " * self.indent_level
         self.c_code.append(indent + code)
 
-    def new_temp(self):
-        """Generate temporary variable name"""
-        self.temp_var_counter += 1
-        return f"_t{self.temp_var_counter}"
-
     # Grammar rules
 
     def p_program(self, p):
@@ -158,12 +207,14 @@ class CCodeGenParser:
         p[0] = ('program', p[1])
 
     def p_statement_list(self, p):
-        '''statement_list : statement statement_list
+        '''statement_list : statement_list statement
                           | empty'''
+        # Left recursive: statements are appended to one flat node
         if len(p) == 3:
-            p[0] = ('stmt_list', p[1], p[2])
+            p[0] = p[1]
+            p[0].append(p[2])
         else:
-            p[0] = ('stmt_list', 'epsilon')
+            p[0] = ['stmt_list']
 
     def p_statement(self, p):
         '''statement : assignment_stmt
@@ -176,17 +227,20 @@ class CCodeGenParser:
     def p_assignment_stmt(self, p):
         '''assignment_stmt : IDENTIFIER ASSIGN expression unit_opt'''
         var_name = p[1]
-        expr_code, expr_value = p[3]
+        expr_value = p[3]
         unit = p[4]
 
-        # Emit expression code first
-        for line in expr_code:
-            self.emit(line)
-
         # Declare variable if first use
-        if var_name not in self.variables:
-            self.variables.add(var_name)
-            self.emit(f"double {var_name};")
+        # (one hash probe: add() grows the set only for a new name)
+        declared = len(self.variables)
+        self.variables.add(var_name)
+        if len(self.variables) != declared:
+            if self.block_stack:
+                # Declare at main's scope so the variable outlives the block
+                # (block code is buffered, main's lines are block_stack[0])
+                self.block_stack[0].append(f"    double {var_name};")
+            else:
+                self.emit(f"double {var_name};")
 
         # Apply unit conversion if present
         if unit:
@@ -210,37 +264,23 @@ class CCodeGenParser:
 
     def p_print_stmt(self, p):
         '''print_stmt : PRINT expression'''
-        expr_code, expr_value = p[2]
-
-        # Emit expression code
-        for line in expr_code:
-            self.emit(line)
-
+        expr_value = p[2]
         self.emit(f'printf("%f\\n", {expr_value});')
 
         p[0] = ('print', expr_value)
 
     def p_if_stmt(self, p):
         '''if_stmt : IF condition THEN block else_opt'''
-        cond_code, cond_expr = p[2]
-
-        # Emit condition code
-        for line in cond_code:
-            self.emit(line)
-
+        cond_expr = p[2]
         self.emit(f"if ({cond_expr}) {{")
-        self.indent_level += 1
 
-        # Process then block (already emitted)
-
-        self.indent_level -= 1
+        # Then block (its lines were buffered, already indented)
+        self.c_code.extend(p[4])
 
         # Handle else
-        if p[5]:
+        if p[5] is not None:
             self.emit("} else {")
-            self.indent_level += 1
-            # else block already emitted
-            self.indent_level -= 1
+            self.c_code.extend(p[5])
 
         self.emit("}")
 
@@ -249,12 +289,12 @@ class CCodeGenParser:
     def p_else_opt(self, p):
         '''else_opt : ELSE block
                     | empty'''
-        p[0] = p[1] if len(p) == 3 else None
+        p[0] = p[2] if len(p) == 3 else None
 
     def p_for_stmt(self, p):
         '''for_stmt : FOR IDENTIFIER IN list_expr DO block'''
         loop_var = p[2]
-        list_code, list_items = p[4]
+        list_items = p[4]
 
         # Generate array
         array_name = f"arr_{loop_var}"
@@ -263,34 +303,38 @@ class CCodeGenParser:
         self.emit(f"double {array_name}[] = {{{items_str}}};")
         self.emit(f"int {array_name}_size = {len(list_items)};")
 
-        if loop_var not in self.variables:
-            self.variables.add(loop_var)
+        self.variables.add(loop_var)
 
         self.emit(f"for (int _i = 0; _i < {array_name}_size; _i++) {{")
         self.indent_level += 1
         self.emit(f"double {loop_var} = {array_name}[_i];")
-
-        # Block already emitted
-
         self.indent_level -= 1
+
+        # Loop body (its lines were buffered, already indented)
+        self.c_code.extend(p[6])
         self.emit("}")
 
         p[0] = ('for', loop_var)
 
     def p_block(self, p):
-        '''block : LBRACE statement_list RBRACE'''
-        p[0] = ('block', p[2])
+        '''block : block_start statement_list RBRACE'''
+        # The block's statements went to their own buffer; hand its lines
+        # to the enclosing statement and go back to the outer buffer
+        p[0] = self.c_code
+        self.c_code = self.block_stack.pop()
+        self.indent_level -= 1
+
+    def p_block_start(self, p):
+        '''block_start : LBRACE'''
+        # Statements are reduced before the if/for that contains them, so
+        # buffer their code until the enclosing statement emits its header
+        self.block_stack.append(self.c_code)
+        self.c_code = []
+        self.indent_level += 1
 
     def p_condition(self, p):
         '''condition : expression comparison_op expression'''
-        left_code, left_val = p[1]
-        op = p[2]
-        right_code, right_val = p[3]
-
-        all_code = left_code + right_code
-        cond_expr = f"{left_val} {op} {right_val}"
-
-        p[0] = (all_code, cond_expr)
+        p[0] = f"{p[1]} {p[2]} {p[3]}"
 
     def p_comparison_op(self, p):
         '''comparison_op : EQUAL
@@ -305,89 +349,56 @@ class CCodeGenParser:
         p[0] = op_map.get(p[1], p[1])
 
     def p_list_expr(self, p):
-        '''list_expr : LBRACKET list_elements RBRACKET'''
-        p[0] = ([], p[2])
+        '''list_expr : LBRACKET list_elements RBRACKET
+                     | LBRACKET RBRACKET'''
+        p[0] = p[2] if len(p) == 4 else []
 
     def p_list_elements(self, p):
-        '''list_elements : expression list_tail
-                         | empty'''
-        if len(p) == 3 and p[1]:
-            expr_code, expr_val = p[1]
-            tail = p[2]
-            p[0] = [expr_val] + tail
-        else:
-            p[0] = []
-
-    def p_list_tail(self, p):
-        '''list_tail : COMMA expression list_tail
-                     | empty'''
+        '''list_elements : list_elements COMMA expression
+                         | expression'''
+        # Left recursive: element values are appended to one list
         if len(p) == 4:
-            expr_code, expr_val = p[2]
-            tail = p[3]
-            p[0] = [expr_val] + tail
+            p[0] = p[1]
+            p[0].append(p[3])
         else:
-            p[0] = []
+            p[0] = [p[1]]
 
     def p_expression(self, p):
         '''expression : term expression_tail'''
-        term_code, term_val = p[1]
-        tail_code, tail_val = p[2]
-
-        if tail_val:
-            # There's an operation
-            temp = self.new_temp()
-            all_code = term_code + tail_code + [f"double {temp} = {term_val} {tail_val};"]
-            p[0] = (all_code, temp)
+        # One flat C expression, ((a + b) - c), instead of a temp per operation
+        if p[2]:
+            p[0] = "(" * len(p[2]) + p[1] + "".join(p[2])
         else:
-            p[0] = (term_code, term_val)
+            p[0] = p[1]
 
     def p_expression_tail(self, p):
-        '''expression_tail : PLUS term expression_tail
-                           | MINUS term expression_tail
+        '''expression_tail : expression_tail PLUS term
+                           | expression_tail MINUS term
                            | empty'''
+        # Left recursive: " op operand)" pieces are appended in order
         if len(p) == 4:
-            op = p[1]
-            term_code, term_val = p[2]
-            tail_code, tail_val = p[3]
-
-            if tail_val:
-                combined = f"{op} {term_val} {tail_val}"
-            else:
-                combined = f"{op} {term_val}"
-
-            p[0] = (term_code + tail_code, combined)
+            p[0] = p[1]
+            p[0].append(f" {p[2]} {p[3]})")
         else:
-            p[0] = ([], None)
+            p[0] = []
 
     def p_term(self, p):
         '''term : factor term_tail'''
-        factor_code, factor_val = p[1]
-        tail_code, tail_val = p[2]
-
-        if tail_val:
-            temp = self.new_temp()
-            all_code = factor_code + tail_code + [f"double {temp} = {factor_val} {tail_val};"]
-            p[0] = (all_code, temp)
+        if p[2]:
+            p[0] = "(" * len(p[2]) + p[1] + "".join(p[2])
         else:
-            p[0] = (factor_code, factor_val)
+            p[0] = p[1]
 
     def p_term_tail(self, p):
-        '''term_tail : MULTIPLY factor term_tail
-                     | DIVIDE factor term_tail
+        '''term_tail : term_tail MULTIPLY factor
+                     | term_tail DIVIDE factor
                      | empty'''
+        # Left recursive, same shape as expression_tail
         if len(p) == 4:
-            op = p[1]
-            factor_code, factor_val = p[2]
-            tail_code, tail_val = p[3]
-
-            if tail_val:
-                combined = f"{op} {factor_val} {tail_val}"
-            else:
-                combined = f"{op} {factor_val}"
-
-            p[0] = (factor_code + tail_code, combined)
+            p[0] = p[1]
+            p[0].append(f" {p[2]} {p[3]})")
         else:
-            p[0] = ([], None)
+            p[0] = []
 
     def p_factor_number(self, p):
         '''factor : NUMBER unit_opt'''
@@ -395,21 +406,25 @@ class CCodeGenParser:
         unit = p[2]
 
         if unit:
+            # Convert to base unit at generation time; an integer factor
+            # keeps the literal an int, as num * factor would be in C
             factor = self.conversions.get(unit, 1)
-            value = f"({num} * {factor})"
+            if isinstance(factor, int):
+                value = f"{num * factor} /* {num} {unit} */"
+            else:
+                value = f"{float(num) * factor!r} /* {num} {unit} */"
         else:
             value = str(num)
 
-        p[0] = ([], value)
+        p[0] = value
 
     def p_factor_identifier(self, p):
         '''factor : IDENTIFIER'''
-        p[0] = ([], p[1])
+        p[0] = p[1]
 
     def p_factor_paren(self, p):
         '''factor : LPAREN expression RPAREN'''
-        expr_code, expr_val = p[2]
-        p[0] = (expr_code, f"({expr_val})")
+        p[0] = f"({p[2]})"
 
     def p_unit_opt(self, p):
         '''unit_opt : UNIT
@@ -427,42 +442,65 @@ class CCodeGenParser:
             print("Syntax error at EOF")
 
     def build(self):
-        """Build the parser"""
-        self.parser = yacc.yacc(module=self)
+        """Build the parser (LALR tables are loaded from TABLE_MODULE when up to date)"""
+        # debug keeps the grammar conflict warnings on stderr; the NullLogger
+        # only drops the parser.out report
+        self.parser = yacc.yacc(module=self, tabmodule=TABLE_MODULE, outputdir=TABLE_DIR,
+                                write_tables=True, debug=True,
+                                debuglog=yacc.NullLogger())
         return self.parser
 
     def parse_and_generate(self, source_code):
         """Parse source and generate C code"""
-        # Reset state
-        self.c_code = []
-        self.indent_level = 0
+        # Reset state, starting with the header already in place
+        self.c_code = [C_HEADER]
+        self.indent_level = 1
         self.variables = set()
-        self.temp_var_counter = 0
-
-        # Generate header
-        self.emit("#include <stdio.h>")
-        self.emit("#include <stdlib.h>")
-        self.emit("")
-        self.emit("int main() {")
-        self.indent_level += 1
+        self.block_stack = []
 
         # Parse
-        result = self.parser.parse(source_code, lexer=self.lexer.lexer)
+        result = self.parser.parse(source_code, lexer=self.lexer)
+
+        # A syntax error can leave blocks open; keep the outermost buffer
+        if self.block_stack:
+            self.c_code = self.block_stack[0]
 
         # Generate footer
-        self.emit("return 0;")
-        self.indent_level -= 1
-        self.emit("}")
+        self.indent_level = 0
+        self.c_code.append(C_FOOTER)
 
         return "\n".join(self.c_code)
 
 
+# Built parser shared by every caller of get_parser()
+_shared_parser = None
+
+
+def get_parser():
+    """Return the shared CCodeGenParser, building it on first use"""
+    global _shared_parser
+    if _shared_parser is None:
+        _shared_parser = CCodeGenParser()
+        _shared_parser.build()
+    return _shared_parser
+
+
+@lru_cache(maxsize=256)
+def translate_to_c(source_code):
+    """Translate source_code with the shared parser (results are cached per source)"""
+    return get_parser().parse_and_generate(source_code)
+
+
 # ============================================================================
 # MAIN TEST PROGRAM
 # ============================================================================
 
-def main():
-    """Test YACC parser with C code generation"""
+def main(argv=None):
+    """Test YACC parser with C code generation (in memory unless files are asked for)"""
+    arg_parser = argparse.ArgumentParser(description="Translate the test programs to C with the yacc parser")
+    arg_parser.add_argument('--emit-files', action='store_true',
+                            help="save each generated program as <test>_yacc.c")
+    args = arg_parser.parse_args(argv)
 
     test_programs = [
         ("simple_assignment", "x = 5 kg\nprint x"),
@@ -473,39 +511,43 @@ def main():
         ("for_loop", "for i in [1, 2, 3] do {\n    print i\n}"),
     ]
 
-    parser = CCodeGenParser()
-    parser.build()
-
-    for test_name, dsl_code in test_programs:
-        print("=" * 80)
-        print(f"TEST: {test_name}")
-        print("=" * 80)
-        print("DSL Code:")
-        print(dsl_code)
-        print("\n" + "-" * 80)
-
+    # Generated files are written on a thread pool while the next test runs
+    saves = []
+    with ThreadPoolExecutor() if args.emit_files else nullcontext() as executor:
+        for test_name, dsl_code in test_programs:
+            print("=" * 80)
+            print(f"TEST: {test_name}")
+            print("=" * 80)
+            print("DSL Code:")
+            print(dsl_code)
+            print("\n" + "-" * 80)
+
+            try:
+                c_code = translate_to_c(dsl_code)
+
+                print("Generated C Code (YACC):")
+                print("-" * 80)
+                print(c_code)
+                print()
+
+                # Save to file (optional)
+                if args.emit_files:
+                    filename = f"{test_name}_yacc.c"
+                    saves.append((filename, executor.submit(Path(filename).write_text, c_code)))
+
+            except Exception as e:
+                print(f"ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+
+    # The pool has finished every write; report each one only now
+    for filename, save in saves:
         try:
-            c_code = parser.parse_and_generate(dsl_code)
-
-            print("Generated C Code (YACC):")
-            print("-" * 80)
-            print(c_code)
-            print()
-
-            # Save to file
-            filename = f"{test_name}_yacc.c"
-            with open(filename, 'w') as f:
-                f.write(c_code)
-            print(f"✓ Saved to {filename}\n")
-
+            save.result()
         except Exception as e:
-            print(f"ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-
-        # Reset parser for next test
-        parser = CCodeGenParser()
-        parser.build()
+            print(f"ERROR: could not save {filename}: {e}")
+        else:
+            print(f"✓ Saved to {filename}\n")
 
 
 if __name__ == "__main__":
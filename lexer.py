@@ -1,54 +1,92 @@
 import re, json, sys, os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
 
 
 # Utilities
 class SymbolTable:
+    __slots__ = ("_map", "_lexemes", "_kinds")
+
+    # kinds are stored as small codes in a byte array
+    KINDS = ("unit", "const_num", "const_str", "id")
+    KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
     def __init__(self):
         self._map = {}  # lexeme -> index
-        self._list = []  # index -> (lexeme, kind)
+        self._lexemes = []  # index -> lexeme
+        self._kinds = array("b")  # index -> kind code
 
     def add(self, lexeme, kind):
-        if lexeme in self._map:
-            return self._map[lexeme]
-        idx = len(self._list)
+        # names repeat a lot, constants rarely do
+        if kind == "id" or kind == "unit":
+            lexeme = sys.intern(lexeme)
+        idx = self._map.get(lexeme)
+        if idx is not None:
+            return idx
+        idx = len(self._lexemes)
         self._map[lexeme] = idx
-        self._list.append((lexeme, kind))
+        self._lexemes.append(lexeme)
+        self._kinds.append(self.KIND_CODES[kind])
         return idx
 
     def items(self):
-        return list(enumerate(self._list))
+        kinds = self.KINDS
+        return [(i, (lex, kinds[k])) for i, (lex, k) in enumerate(zip(self._lexemes, self._kinds))]
 
     def __str__(self):
         out = []
-        for i, (lex, k) in enumerate(self._list):
+        for i, (lex, k) in self.items():
             out.append(f"{i}\t{lex}\t{k}")
         return "\n".join(out)
 
 
+# Characters str.splitlines() breaks on (\r\n counts as one break)
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+LINE_BREAK_RE = re.compile(rf"\r\n|[{LINE_BREAKS}]")
+WORD_CHAR_RE = re.compile(r"\w")
+
+
 # Build token regex from tokens.json
 def build_regex(tokdef):
     # Multi-char operators must be tried before single-char -> sort by desc length
     operators = sorted(tokdef.get("operators", {}).keys(), key=lambda s: -len(s))
     delimiters = sorted(tokdef.get("delimiters", {}).keys(), key=lambda s: -len(s))
-    keywords = sorted(tokdef.get("keywords", {}).keys(), key=lambda s: -len(s))
-    units = sorted(tokdef.get("units", {}).keys(), key=lambda s: -len(s))
 
     # escape tokens for regex
     re_operators = "|".join(re.escape(op) for op in operators) if operators else None
     re_delimiters = "|".join(re.escape(d) for d in delimiters) if delimiters else None
-    re_keywords = r"\b(?:" + "|".join(keywords) + r")\b" if keywords else None
-    re_units = r"\b(?:" + "|".join(units) + r")\b" if units else None
 
     # number: optional minus, integer or decimal
-    number_re = r"-?\d+(\.\d+)?"
-    # string: double quotes (simple)
-    string_re = r"\"([^\"\\]|\\.)*\""
+    number_re = r"-?\d+(?:\.\d+)?"
+    # string: double quotes (simple), never spanning a line break; the loop is
+    # unrolled so plain runs are eaten by one class instead of an alternation
+    plain = rf"[^\"\\{LINE_BREAKS}]*"
+    string_re = rf"\"{plain}(?:\\[^{LINE_BREAKS}]{plain})*\""
     # identifier: starts with letter or underscore
     identifier_re = r"[A-Za-z][A-Za-z0-9_]*"
 
-    parts = []
+    # keywords and units shaped like identifiers are matched as ID and
+    # reclassified by lookup; any others keep their own alternatives
+    is_identifier = re.compile(identifier_re).fullmatch
+    keywords = sorted((k for k in tokdef.get("keywords", {}) if not is_identifier(k)),
+                      key=lambda s: -len(s))
+    units = sorted((u for u in tokdef.get("units", {}) if not is_identifier(u)),
+                   key=lambda s: -len(s))
+    re_keywords = r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b" if keywords else None
+    re_units = r"\b(?:" + "|".join(re.escape(u) for u in units) + r")\b" if units else None
+
+    # whitespace is matched too, so matches cover the source without gaps
+    parts = [r"(?P<WS>\s+)"]
     if re_keywords:
         parts.append(f"(?P<KEYWORD>{re_keywords})")
+    # the alternatives start with disjoint characters, so the most common
+    # ones go first; OP must stay before NUMBER so "-" is an operator, and
+    # ID may only jump ahead if nothing it passes starts with a letter
+    id_first = not any(t[:1].isalpha() for t in operators + delimiters + units)
+    if id_first:
+        parts.append(f"(?P<ID>{identifier_re})")
     if re_operators:
         parts.append(f"(?P<OP>{re_operators})")
     if re_delimiters:
@@ -58,7 +96,10 @@ def build_regex(tokdef):
 
     parts.append(f"(?P<NUMBER>{number_re})")
     parts.append(f"(?P<STRING>{string_re})")
-    parts.append(f"(?P<ID>{identifier_re})")
+    if not id_first:
+        parts.append(f"(?P<ID>{identifier_re})")
+    # anything else up to the next whitespace is one unknown token
+    parts.append(r"(?P<ERROR>\S+)")
 
     master = "|".join(parts)
     return re.compile(master)
@@ -66,103 +107,149 @@ def build_regex(tokdef):
 
 # Lexical analyzer
 def tokenize_source(source_text, tokdef, pattern, st):
-    pif = []
+    # the PIF is kept as two parallel int arrays: token codes and ST indices
+    codes = array("i")
+    indices = array("i")
     errors = []
-    line_no = 0
-    for raw_line in source_text.splitlines():
-        line_no += 1
-        line = raw_line
-        pos = 0
-        while pos < len(line):
-            # skip whitespace
-            if line[pos].isspace():
-                pos += 1
-                continue
-            m = pattern.match(line, pos)
-            if not m:
-                # No match -> lexical error (show token until next whitespace or known char)
-                # find a segment to report
-                end = pos
-                while end < len(line) and not line[end].isspace():
-                    end += 1
-                lexeme = line[pos:end]
-                errors.append(f"Lexical error: unknown token '{lexeme}' at line {line_no}")
-                pos = end
+    line_no = 1
+    counted_to = 0  # line breaks before this offset are in line_no
+
+    # token code tables, looked up once instead of per token
+    keywords = tokdef.get("keywords", {})
+    operators = tokdef.get("operators", {})
+    delimiters = tokdef.get("delimiters", {})
+    units = tokdef.get("units", {})
+    special = tokdef.get("special", {})
+    add = st.add
+    append_code = codes.append
+    append_index = indices.append
+
+    # (code, ST index) for each token kind; IDs are classified inline below
+    # (keywords, then units, then identifiers)
+    handlers = {
+        "KEYWORD": lambda val: (keywords[val], -1),
+        "UNIT": lambda val: (units[val], add(val, "unit")),  # store unit in ST
+        "OP": lambda val: (operators[val], -1),
+        "DELIM": lambda val: (delimiters[val], -1),
+        "NUMBER": lambda val: (special["number"], add(val, "const_num")),
+        "STRING": lambda val: (special["string"], add(val, "const_str")),
+    }
+
+    # one pass over the whole source; every character is in some match
+    for m in pattern.finditer(source_text):
+        kind = m.lastgroup
+        if kind == "WS":
+            continue
+        val = m.group()
+        if kind == "ID":
+            code = keywords.get(val)
+            if code is not None:
+                append_code(code)
+                append_index(-1)
                 continue
-            pos = m.end()
-            kind = m.lastgroup
-            val = m.group()
+            code = units.get(val)
+            if code is not None:
+                # a unit glued to a word character (e.g. 5kg) stays an identifier
+                start, end = m.span()
+                if (start and WORD_CHAR_RE.match(source_text, start - 1)) or \
+                        WORD_CHAR_RE.match(source_text, end):
+                    code = None
+            if code is not None:
+                idx = add(val, "unit")  # store unit in ST
+            else:
+                code = special["identifier"]
+                idx = add(val, "id")
+        elif kind == "ERROR":
+            # No match -> lexical error (the token runs until the next whitespace)
+            # line numbers are only needed here, so breaks are counted lazily
+            start = m.start()
+            line_no += len(LINE_BREAK_RE.findall(source_text, counted_to, start))
+            counted_to = start
+            errors.append(f"Lexical error: unknown token '{val}' at line {line_no}")
+            continue
+        else:
             # classify and write PIF entries using tokdef codes
-            match kind:
-                case "KEYWORD":
-                    code = tokdef["keywords"][val]
-                    pif.append((code, -1))
-                case "OP":
-                    code = tokdef["operators"][val]
-                    pif.append((code, -1))
-                case "DELIM":
-                    code = tokdef["delimiters"][val]
-                    pif.append((code, -1))
-                case "UNIT":
-                    code = tokdef["units"][val]
-                    # store unit in ST
-                    idx = st.add(val, "unit")
-                    pif.append((code, idx))
-                case "NUMBER":
-                    code = tokdef["special"]["number"]
-                    idx = st.add(val, "const_num")
-                    pif.append((code, idx))
-                case "STRING":
-                    code = tokdef["special"]["string"]
-                    idx = st.add(val, "const_str")
-                    pif.append((code, idx))
-                case "ID":
-                    if val in tokdef.get("keywords", {}):
-                        code = tokdef["keywords"][val]
-                        pif.append((code, -1))
-                    else:
-                        code = tokdef["special"]["identifier"]
-                        idx = st.add(val, "id")
-                        pif.append((code, idx))
-                case _:
-                    errors.append(f"Lexical error: unknown token '{val}' at line {line_no}")
-    return pif, errors
+            code, idx = handlers[kind](val)
+        append_code(code)
+        append_index(idx)
+    return (codes, indices), errors
 
 
 # File IO and main
-def analyze_file(tokens_file, source_file):
-    with open(tokens_file, "r") as f:
-        tokdef = json.load(f)
-    pattern = build_regex(tokdef)
+def analyze_file(tokdef, pattern, source_file, binary=False):
     with open(source_file, "r") as f:
         src = f.read()
     st = SymbolTable()
     pif, errors = tokenize_source(src, tokdef, pattern, st)
 
     base = os.path.splitext(os.path.basename(source_file))[0]
-    pif_file = f"PIF_{base}.txt"
+    pif_file = f"PIF_{base}.pifbin" if binary else f"PIF_{base}.txt"
     st_file = f"ST_{base}.txt"
     err_file = f"lexical_errors_{base}.txt"
 
-    with open(pif_file, "w") as f:
-        for code, idx in pif:
-            f.write(f"{code} {idx}\n")
-    with open(st_file, "w") as f:
-        f.write(str(st))
-    with open(err_file, "w") as f:
-        if errors:
-            f.write("\n".join(errors))
-        else:
-            f.write("No lexical errors found.\n")
+    if binary:
+        # (code, index) pairs as native int32, copied straight from the arrays
+        codes, indices = pif
+        pairs = array("i", bytes(2 * codes.itemsize * len(codes)))
+        pairs[0::2] = codes
+        pairs[1::2] = indices
+        with open(pif_file, "wb") as f:
+            f.write(pairs.tobytes())
+    else:
+        # PIF entries repeat a lot (keywords, operators, reused names), so each
+        # distinct entry is formatted once and the lines are looked up
+        entries = list(zip(*pif))
+        lines = {entry: f"{entry[0]} {entry[1]}\n" for entry in set(entries)}
+        with open(pif_file, "w") as f:
+            f.write("".join(map(lines.__getitem__, entries)))
 
-    print(f"Output written: {pif_file}, {st_file}, {err_file}")
+    # format each file in full, then write it with a single call
+    err_text = "\n".join(errors) if errors else "No lexical errors found.\n"
+    for path, text in ((st_file, str(st)), (err_file, err_text)):
+        with open(path, "w") as f:
+            f.write(text)
+
+    return pif_file, st_file, err_file
+
+
+# Per-process state of the worker pool, set once by _init_worker
+_TOKDEF = None
+_PATTERN = None
+
+
+def _init_worker(tokdef):
+    global _TOKDEF, _PATTERN
+    _TOKDEF = tokdef
+    _PATTERN = build_regex(tokdef)
+
+
+def _analyze_worker(source_file, binary):
+    return analyze_file(_TOKDEF, _PATTERN, source_file, binary)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python lexer.py tokens.json program1.mini [program2.mini ...]")
+    # --binary writes the PIF as int32 pairs instead of text
+    args = [arg for arg in sys.argv[1:] if arg != "--binary"]
+    binary = len(args) < len(sys.argv) - 1
+    if len(args) < 2:
+        print("Usage: python lexer.py [--binary] tokens.json program1.mini [program2.mini ...]")
         sys.exit(1)
-    tokens_file = sys.argv[1]
+    tokens_file = args[0]
     print(tokens_file)
-    for i in range(2, len(sys.argv)):
-        analyze_file(tokens_file, sys.argv[i])
+    # the token definitions and regex are shared by every source file
+    with open(tokens_file, "r") as f:
+        tokdef = json.load(f)
+    source_files = args[1:]
+    # files are independent, so several of them are spread over worker
+    # processes that each build the regex once
+    workers = min(len(source_files), os.cpu_count() or 1)
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tokdef,))
+        run = executor.map
+    else:
+        _init_worker(tokdef)
+        executor = nullcontext()
+        run = map
+    with executor:
+        for pif_file, st_file, err_file in run(_analyze_worker, source_files, repeat(binary)):
+            print(f"Output written: {pif_file}, {st_file}, {err_file}")